@@ -0,0 +1,173 @@
+"""Plays many boards of the same size at once with numpy
+
+A GameBatch stores the mines, flags and hints of all boards as arrays of
+the shape (boards, rows, columns), so a move on every board is a few array
+operations instead of a Python loop over the boards and their fields.
+"""
+
+from minesweeper import Flags, Game
+from table import Table
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# actions of step
+SKIP = 0
+REVEAL = 1
+MARK = 2
+
+def _neighbor_sum(planes):
+    """Returns the number of set neighbors of every field of a stack of boolean boards."""
+    _, rows, columns = planes.shape
+    padded = numpy.pad(planes.astype(numpy.int8), ((0, 0), (1, 1), (1, 1)))
+    total = numpy.zeros(planes.shape, dtype=numpy.int8)
+    for dy in range(3):
+        for dx in range(3):
+            if dy != 1 or dx != 1:
+                total += padded[:, dy:dy+rows, dx:dx+columns]
+    return total
+
+def _dilate(planes):
+    """Returns the fields that are set or have a set neighbor on a stack of boolean boards."""
+    rows = planes.copy()
+    rows[:, :, 1:] |= planes[:, :, :-1]
+    rows[:, :, :-1] |= planes[:, :, 1:]
+    result = rows.copy()
+    result[:, 1:, :] |= rows[:, :-1, :]
+    result[:, :-1, :] |= rows[:, 1:, :]
+    return result
+
+class GameBatch:
+    """Boards of the same size that are played together.
+    The rules are the same as for Game: revealing a field without
+    neighboring mines reveals its neighbors as well, revealing a Marked
+    field unmarks it, revealing a revealed field whose hint equals the
+    number of marked neighbors reveals the other neighbors and all mines
+    are marked once every safe field is revealed.
+    Requires numpy.
+    """
+    def __init__(self, mines, flags=None):
+        if numpy is None:
+            raise ImportError('GameBatch requires numpy')
+        self.mines = numpy.array(mines, dtype=bool)
+        if self.mines.ndim != 3:
+            raise ValueError('Mines must have the shape (boards, rows, columns) but have {0}'.format(self.mines.shape))
+        if flags is None:
+            self.flags = numpy.full(self.mines.shape, Flags.Unknown, dtype=numpy.uint8)
+        else:
+            self.flags = numpy.array(flags, dtype=numpy.uint8)
+            if self.flags.shape != self.mines.shape:
+                raise ValueError('Fields cannot have different sizes ({0} != {1})'.format(
+                    self.mines.shape, self.flags.shape))
+        self.hints = numpy.where(self.mines, -1, _neighbor_sum(self.mines)).astype(numpy.int8)
+        self.num_mines = self.mines.sum(axis=(1, 2))
+
+    @classmethod
+    def create_random(cls, count, columns, rows, number_of_mines, seed=None, safe=None):
+        """Generates count boards with randomly placed mines like Game.create_random.
+        The mines are the fields with the lowest random keys, and the safe
+        field and its neighbors get keys that are never among them.
+        """
+        if numpy is None:
+            raise ImportError('GameBatch requires numpy')
+        keys = numpy.random.default_rng(seed).random((count, rows*columns))
+        available = rows*columns
+        if safe is not None:
+            excluded = numpy.zeros((rows, columns), dtype=bool)
+            x, y = safe
+            if not (0 <= x < columns and 0 <= y < rows):
+                raise IndexError('Safe field {0} is outside of the board'.format(tuple(safe)))
+            excluded[max(y-1, 0):y+2, max(x-1, 0):x+2] = True
+            keys[:, excluded.ravel()] = 2
+            available -= int(excluded.sum())
+        if number_of_mines < 0 or number_of_mines > available:
+            raise ValueError('Cannot place {0} mines on {1} fields'.format(number_of_mines, available))
+        mines = numpy.zeros((count, rows*columns), dtype=bool)
+        if number_of_mines > 0:
+            chosen = numpy.argpartition(keys, number_of_mines - 1, axis=1)[:, :number_of_mines]
+            numpy.put_along_axis(mines, chosen, True, axis=1)
+        return cls(mines.reshape(count, rows, columns))
+
+    def __len__(self):
+        return self.mines.shape[0]
+
+    def is_solved(self):
+        """Returns a boolean array that is True for the boards whose mines are all marked."""
+        return ((self.flags == Flags.Marked) | ~self.mines).all(axis=(1, 2))
+
+    def is_lost(self):
+        """Returns a boolean array that is True for the boards with a revealed mine."""
+        return ((self.flags == Flags.Revealed) & self.mines).any(axis=(1, 2))
+
+    def step(self, actions, x, y, reveal_known=True):
+        """Applies one action to every board: SKIP, REVEAL or MARK at the field (x[i], y[i]).
+        MARK toggles the mark like Game.toggle_mark.
+        All cascades are expanded together, one ring of fields per iteration.
+        The fields of boards with SKIP are ignored, the others must be inside the board.
+        Returns the arrays won, lost and changed, where changed holds the
+        fields of each board whose flag was changed.
+        """
+        actions = numpy.asarray(actions)
+        x, y = numpy.asarray(x), numpy.asarray(y)
+        if actions.shape != (len(self),) or x.shape != actions.shape or y.shape != actions.shape:
+            raise ValueError('Expected an action and a field for each of the {0} boards'.format(len(self)))
+        _, rows, columns = self.mines.shape
+        active = actions != SKIP
+        outside = active & ((x < 0) | (x >= columns) | (y < 0) | (y >= rows))
+        if outside.any():
+            board = int(numpy.flatnonzero(outside)[0])
+            raise IndexError('Field ({0}, {1}) of board {2} is outside of the board'.format(x[board], y[board], board))
+        x, y = numpy.where(active, x, 0), numpy.where(active, y, 0)
+        boards = numpy.arange(len(self))
+        old = self.flags.copy()
+        flags = self.flags
+        unknown = flags == Flags.Unknown
+        current = flags[boards, y, x]
+
+        # the fields each board starts to reveal from
+        seeds = numpy.zeros(flags.shape, dtype=bool)
+        reveal = actions == REVEAL
+        seeds[boards, y, x] = reveal & (current == Flags.Unknown)
+        if reveal_known:
+            marked = _neighbor_sum(flags == Flags.Marked)[boards, y, x]
+            hints = self.hints[boards, y, x]
+            chord = reveal & (current == Flags.Revealed) & (hints > 0) & (marked == hints)
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    nx, ny = x + dx, y + dy
+                    inside = chord & (nx >= 0) & (ny >= 0) & (nx < flags.shape[2]) & (ny < flags.shape[1])
+                    seeds[boards[inside], ny[inside], nx[inside]] = True
+        seeds &= unknown
+        # revealing a marked field unmarks it
+        unmark = reveal & (current == Flags.Marked)
+        flags[boards[unmark], y[unmark], x[unmark]] = Flags.Unknown
+
+        revealed = seeds.copy()
+        frontier = seeds
+        zero = self.hints == 0
+        while frontier.any():
+            frontier = _dilate(frontier & zero) & unknown & ~revealed
+            revealed |= frontier
+        flags[revealed] = Flags.Revealed
+
+        # like Game, mines are marked automatically after a reveal without a mine and after every mark
+        ok = revealed.any(axis=(1, 2)) & ~(revealed & self.mines).any(axis=(1, 2))
+        toggle = actions == MARK
+        toggled = current[toggle]
+        flags[boards[toggle], y[toggle], x[toggle]] = numpy.where(toggled == Flags.Unknown, Flags.Marked,
+            numpy.where(toggled == Flags.Marked, Flags.Unknown, toggled))
+        num_safe = flags.shape[1]*flags.shape[2] - self.num_mines
+        all_revealed = ((flags == Flags.Revealed) & ~self.mines).sum(axis=(1, 2)) == num_safe
+        auto_mark = all_revealed & ((reveal & ok) | toggle)
+        flags[auto_mark[:, None, None] & self.mines] = Flags.Marked
+
+        return (self.is_solved(), self.is_lost(), flags != old)
+
+    def game(self, index):
+        """Returns a copy of a board as a Game."""
+        _, rows, columns = self.mines.shape
+        mines = Table.from_list(columns, rows, self.mines[index].astype(numpy.uint8).tobytes(), dtype='u1')
+        flags = Table.from_list(columns, rows, self.flags[index].tobytes(), dtype='u1')
+        return Game(mines, flags)
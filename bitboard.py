@@ -0,0 +1,298 @@
+"""A game backend that keeps the mines and flags as bit planes in big integers
+
+Every plane is a single Python int with one bit per field. A row of the
+board occupies columns+1 bits, so the bit of field (x, y) is x + y*width
+with width = columns+1. The extra bit at the end of every row is always
+cleared in the results, so moving a plane by one column never wraps a
+field into the neighboring row.
+"""
+
+import itertools
+from minesweeper import Game, Flags, storage
+from table import Table, pack_bits, unpack_bits, _assign_values
+
+# bytes mapping the flags of the fields to the bits of the revealed and the marked plane
+_REVEALED = bytes(1 if f == Flags.Revealed else 0 for f in range(256))
+_MARKED = bytes(1 if f == Flags.Marked else 0 for f in range(256))
+# number of single fields changed outside of the plane operations that
+# are applied bit by bit, more fields are loaded from the flags table at once
+SYNC_FIELDS = 64
+# the flags table is written as a whole instead of field by field if more
+# than 1/BULK_FRACTION of the fields change
+BULK_FRACTION = 16
+# the fields of a plane with at most this many set bits are found bit by bit
+# instead of unpacking the whole plane
+WALK_FIELDS = 256
+
+def neighbor_counts(bits, width, cells):
+    """Returns the number of set neighbors of every cell as four bit planes, lowest bit first.
+    The eight shifted planes are summed with a bit-sliced ripple carry adder.
+    On a 2x2 board with mines on the diagonal, the other fields have 2 neighboring mines:
+    >>> [bin(p) for p in neighbor_counts(0b10001, 3, 0b11011)]
+    ['0b10001', '0b1010', '0b0', '0b0']
+    """
+    counts = [0, 0, 0, 0]
+    for shift in (1, width-1, width, width+1):
+        for plane in (bits << shift, bits >> shift):
+            carry = plane & cells
+            for k in range(4):
+                if not carry:
+                    break
+                counts[k], carry = counts[k] ^ carry, counts[k] & carry
+    return counts
+
+def set_bits(bits):
+    """Yields the indices of the set bits from the lowest.
+    Every step removes the bits up to the lowest set bit, so the time depends
+    on the number of set bits and on the span between them.
+    >>> list(set_bits(0b10110))
+    [1, 2, 4]
+    """
+    index = 0
+    while bits:
+        step = (bits & -bits).bit_length() - 1
+        index += step
+        yield index
+        bits >>= step + 1
+        index += 1
+
+def dilate(bits, width, cells):
+    """Returns the cells that are set or have a set neighbor.
+    >>> bin(dilate(0b1, 3, 0b11011))
+    '0b11011'
+    """
+    row = bits | bits << 1 | bits >> 1
+    return (row | row << width | row >> width) & cells
+
+class BitboardGame(Game):
+    """Game whose moves work on bit planes instead of single fields.
+    The mines, flags and hints tables are kept as in Game, so the game
+    can be used everywhere a Game is used, but the region revealed by a
+    flood fill grows by dilating it in steps that are masked by the plane of
+    fields without neighboring mines, and the hints, auto_mark, reveal_all,
+    is_solved and is_lost are a few operations on whole planes.
+    Only the fields in the resulting planes are written to the flags table.
+    Flags changed field by field, e.g. by toggle_mark or restore, are applied
+    to the planes before the next plane operation.
+    >>> game = BitboardGame(Table.from_nested_list([[False, False, False], [False, False, True]]))
+    >>> game.reveal(0, 0)
+    True
+    >>> print(game.to_text(), end='')
+    01?
+    01?
+    """
+    def __init__(self, mines, flags=None):
+        if flags is None:
+            flags = Table(mines.num_columns, mines.num_rows, Flags.Unknown, dtype='u1')
+        if mines.size() != flags.size():
+            raise ValueError('Fields cannot have different sizes ({0} != {1})'.format(mines.size(), flags.size()))
+        self.mines = mines
+        self.flags = flags
+        self.changed = []
+        self._count_fields()
+        self.hints = self._compute_hints()
+
+    @classmethod
+    def _from_tables(cls, mines, flags, hints, counters):
+        game = super()._from_tables(mines, flags, hints, counters)
+        game._load_planes()
+        return game
+
+    def _pack(self, data):
+        """Returns the plane of bytes with one value per field in linear index order."""
+        columns, rows = self.mines.size()
+        padded = bytearray(self.width*rows)
+        for y in range(rows):
+            padded[y*self.width:y*self.width+columns] = data[y*columns:(y+1)*columns]
+        return int.from_bytes(pack_bits(padded, 1), 'little')
+
+    def _unpack(self, bits):
+        """Returns a byte per bit of a plane including the padding of the rows."""
+        count = self.width*self.mines.num_rows
+        return unpack_bits(bits.to_bytes((count + 7)//8, 'little'), 1, count)
+
+    def _strip(self, data):
+        """Returns the bytes of the fields without the padding of the rows."""
+        columns, rows = self.mines.size()
+        return b''.join(data[y*self.width:y*self.width+columns] for y in range(rows))
+
+    def _load_planes(self):
+        """Creates all planes from the mines and flags tables."""
+        columns, rows = self.mines.size()
+        self.width = columns + 1
+        self.cell_bits = self._pack(b'\x01'*(columns*rows))
+        self.mine_bits = self._pack(self.mines.tobytes())
+        # safe fields without neighboring mines
+        self.zero_bits = self.cell_bits & ~dilate(self.mine_bits, self.width, self.cell_bits)
+        self._load_flag_planes()
+
+    def _load_flag_planes(self):
+        flags = self.flags.tobytes()
+        self.revealed_bits = self._pack(flags.translate(_REVEALED))
+        self.marked_bits = self._pack(flags.translate(_MARKED))
+        # fields changed by _set_flag that are not in the planes yet
+        self._pending = []
+
+    def _sync(self):
+        """Applies the fields changed by _set_flag to the planes."""
+        pending = self._pending
+        if len(pending) > SYNC_FIELDS:
+            self._load_flag_planes()
+            return
+        for x, y in pending:
+            bit = 1 << (x + y*self.width)
+            flag = self.flags[x, y]
+            self.revealed_bits = self.revealed_bits | bit if flag == Flags.Revealed else self.revealed_bits & ~bit
+            self.marked_bits = self.marked_bits | bit if flag == Flags.Marked else self.marked_bits & ~bit
+        self._pending = []
+
+    def _compute_hints(self):
+        """Returns the hints table computed from the neighbor counts of the mine plane."""
+        columns, rows = self.mines.size()
+        planes = neighbor_counts(self.mine_bits, self.width, self.cell_bits)
+        # every byte of the unpacked planes is 0 or 1, so the shifted and
+        # scaled values add up to the hint of each field without any carry
+        values = int.from_bytes(self._unpack(self.mine_bits), 'little')*0xff
+        for k, plane in enumerate(planes):
+            values += int.from_bytes(self._unpack(plane & ~self.mine_bits), 'little') << k
+        return Table.from_list(columns, rows, self._strip(values.to_bytes(self.width*rows, 'little')), dtype='i1')
+
+    def _count_fields(self):
+        """Loads the planes and counts the fields with a population count of each plane."""
+        self._load_planes()
+        self._count_planes()
+
+    def _count_planes(self):
+        mines, revealed, marked = self.mine_bits, self.revealed_bits, self.marked_bits
+        self.num_mines = mines.bit_count()
+        self.num_revealed_mines = (revealed & mines).bit_count()
+        self.num_revealed_safe = revealed.bit_count() - self.num_revealed_mines
+        self.num_marked = marked.bit_count()
+        self.num_marked_mines = (marked & mines).bit_count()
+
+    def check_counters(self):
+        """Compares the counters and the planes against the tables.
+        Raises an AssertionError if any of them does not match.
+        """
+        self._sync()
+        planes = (self.revealed_bits, self.marked_bits)
+        super().check_counters()
+        if planes != (self.revealed_bits, self.marked_bits):
+            raise AssertionError('The flag planes do not match the flags table')
+
+    def _set_flag(self, x, y, flag):
+        self._pending.append((x, y))
+        super()._set_flag(x, y, flag)
+
+    def _apply(self, bits, flag):
+        """Changes the flag of all fields of a plane to Revealed or Marked.
+        The planes and counters are updated from the changed bits, only the
+        flags table, the changed list and the history are written field by field.
+        """
+        revealed, marked, mines = self.revealed_bits, self.marked_bits, self.mine_bits
+        bits ^= bits & (revealed if flag == Flags.Revealed else marked)
+        if not bits:
+            return
+        was_revealed, was_marked = bits & revealed, bits & marked
+        if flag == Flags.Revealed:
+            self.revealed_bits, self.marked_bits = revealed | bits, marked ^ was_marked
+        else:
+            self.revealed_bits, self.marked_bits = revealed ^ was_revealed, marked | bits
+        count = bits.bit_count()
+        num_mines = (bits & mines).bit_count()
+        if was_revealed:
+            revealed_mines = (was_revealed & mines).bit_count()
+            self.num_revealed_mines -= revealed_mines
+            self.num_revealed_safe -= was_revealed.bit_count() - revealed_mines
+        if was_marked:
+            self.num_marked -= was_marked.bit_count()
+            self.num_marked_mines -= (was_marked & mines).bit_count()
+        if flag == Flags.Revealed:
+            self.num_revealed_mines += num_mines
+            self.num_revealed_safe += count - num_mines
+        else:
+            self.num_marked += count
+            self.num_marked_mines += num_mines
+
+        width = self.width
+        columns = width - 1
+        flags = storage(self.flags)
+        history = self._history
+        if count <= WALK_FIELDS:
+            fields = [(i % width, i // width) for i in set_bits(bits)]
+            if history is not None:
+                old = [flags[x + y*columns] for x, y in fields]
+        else:
+            data = self._unpack(bits)
+            fields = [(i % width, i // width) for i in itertools.compress(range(len(data)), data)]
+            if history is not None:
+                old_plane = (int.from_bytes(self._unpack(was_revealed), 'little')*Flags.Revealed +
+                    int.from_bytes(self._unpack(was_marked), 'little')*Flags.Marked).to_bytes(len(data), 'little')
+                old = [old_plane[x + y*width] for x, y in fields]
+        if history is not None:
+            if self._history_position != len(history):
+                del history[self._history_position:]
+            history.extend((x, y, o, flag) for (x, y), o in zip(fields, old))
+            self._history_position = len(history)
+        num_bits = width*self.mines.num_rows
+        if flags is not self.flags and count*BULK_FRACTION > num_bits:
+            # write the whole table at once from the planes
+            values = (int.from_bytes(self._unpack(self.revealed_bits), 'little')*Flags.Revealed +
+                int.from_bytes(self._unpack(self.marked_bits), 'little')*Flags.Marked)
+            _assign_values(flags, 0, len(flags), self._strip(values.to_bytes(num_bits, 'little')))
+        else:
+            # the bit of (x, y) is x + y*width, the linear index is x + y*columns
+            for x, y in fields:
+                flags[x + y*columns] = flag
+        self.changed.extend(fields)
+
+    def _flood_fill(self, fields):
+        """Reveals the Unknown fields and grows the revealed region by its
+        neighbors until no field without neighboring mines is added.
+        """
+        self._sync()
+        width, cells = self.width, self.cell_bits
+        start = 0
+        for x, y in fields:
+            start |= 1 << (x + y*width)
+        blocked = self.revealed_bits | self.marked_bits
+        region = added = start ^ (start & blocked)
+        if added & self.zero_bits:
+            # the plane of unknown fields is only needed if the region grows
+            unknown = cells & ~(blocked | added)
+            while added:
+                added = dilate(added & self.zero_bits, width, cells) & unknown
+                unknown ^= added
+                region |= added
+        self._apply(region, Flags.Revealed)
+        return not region & self.mine_bits
+
+    def is_solved(self):
+        """Returns true if all mines are flagged."""
+        self._sync()
+        return not self.mine_bits & ~self.marked_bits
+
+    def is_lost(self):
+        """Returns true if a mine is revealed and the game is lost."""
+        self._sync()
+        return bool(self.mine_bits & self.revealed_bits)
+
+    def auto_mark(self):
+        """Marks all mines that are not marked yet but only if all non-mine fields are already revealed."""
+        num_fields = self.mines.num_columns*self.mines.num_rows
+        if self.num_revealed_safe != num_fields - self.num_mines:
+            return False
+        self._sync()
+        self._apply(self.mine_bits & ~self.marked_bits, Flags.Marked)
+
+    def reveal_all(self):
+        """Reveals all fields that are not marked."""
+        self.changed = []
+        self._sync()
+        self._apply(self.cell_bits & ~(self.revealed_bits | self.marked_bits), Flags.Revealed)
+        if self.check_consistency:
+            self.check_counters()
+
+    def move_mines_away(self, x, y, seed=None):
+        super().move_mines_away(x, y, seed)
+        self._load_planes()
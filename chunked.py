@@ -0,0 +1,209 @@
+"""Provides an unbounded minesweeper game whose mines are generated on demand"""
+
+import random
+from minesweeper import Flags, Game, compute_hints
+from table import Table
+
+# the lowest density of mines of a ChunkedGame, which keeps the regions without
+# neighboring mines small
+MIN_DENSITY = 0.13
+
+class ChunkedTable:
+    """Unbounded 2D table that is split into square chunks of a fixed size.
+    Chunks are created when they are first written or, if a factory is
+    given, when they are first read. Reading from a chunk that does not
+    exist returns the initial value without creating it.
+    The factory is called with the chunk coordinates and returns a Table.
+    >>> t = ChunkedTable(4)
+    >>> t[-1, 10]
+    0
+    >>> t[-1, 10] = 3
+    >>> t[-1, 10], t[-2, 10]
+    (3, 0)
+    >>> sorted(t.chunks)
+    [(-1, 2)]
+    >>> t = ChunkedTable(4, factory=lambda cx, cy: Table(4, 4, cx))
+    >>> t[9, 0]
+    2
+    >>> sorted(t.chunks)
+    [(2, 0)]
+    """
+    num_columns = None
+    num_rows = None
+
+    def __init__(self, chunk_size, initial=0, dtype=None, factory=None):
+        if chunk_size <= 0:
+            raise ValueError('Chunk size cannot be smaller than 1')
+        self.chunk_size = chunk_size
+        self.initial = initial
+        self.dtype = dtype
+        self.factory = factory
+        self.chunks = {}
+
+    def size(self):
+        """Returns the dimensions of the table, which are unbounded."""
+        return (None, None)
+
+    def chunk(self, cx, cy):
+        """Returns the chunk with the given chunk coordinates and creates it if necessary."""
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            if self.factory is None:
+                chunk = Table(self.chunk_size, self.chunk_size, self.initial, self.dtype)
+            else:
+                chunk = self.factory(cx, cy)
+            self.chunks[cx, cy] = chunk
+        return chunk
+
+    def __getitem__(self, key):
+        """Returns the value of the cell at (column, row)."""
+        x, y = key
+        cx, ix = divmod(x, self.chunk_size)
+        cy, iy = divmod(y, self.chunk_size)
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            if self.factory is None:
+                return self.initial
+            chunk = self.chunk(cx, cy)
+        return chunk.table[ix + iy*self.chunk_size]
+
+    def __setitem__(self, key, value):
+        """Overrides the value of the cell at (column, row)."""
+        x, y = key
+        cx, ix = divmod(x, self.chunk_size)
+        cy, iy = divmod(y, self.chunk_size)
+        self.chunk(cx, cy).table[ix + iy*self.chunk_size] = value
+
+    def neighbors(self, x, y):
+        """Returns a generator for all direct neighbors of a cell.
+        Does not return the cell itself.
+        """
+        for c in range(x-1, x+2):
+            for r in range(y-1, y+2):
+                if c != x or r != y:
+                    yield (c, r)
+
+    def cells(self):
+        """Returns a generator of (column, row, value) for all cells in existing chunks."""
+        size = self.chunk_size
+        for (cx, cy), chunk in list(self.chunks.items()):
+            for i, value in enumerate(chunk):
+                yield (cx*size + i % size, cy*size + i // size, value)
+
+class ChunkedGame(Game):
+    """Unbounded playing field whose mines are generated chunk by chunk.
+    The mines of a chunk only depend on the seed and the chunk coordinates,
+    so a seed always describes the same board no matter in which order the
+    chunks are visited. Mines and hints of a chunk are generated when a field
+    of the chunk or of a neighboring chunk is first accessed, flags when a
+    field of the chunk is first changed. Memory use is therefore proportional
+    to the explored area.
+    Every chunk contains the same number of mines. The density must be large
+    enough that regions without neighboring mines are finite, otherwise a
+    single reveal could never finish. The regions grow quickly towards lower
+    densities: at MIN_DENSITY a single reveal opens up to about a thousand
+    fields, at 0.1 already tens of thousands in over a hundred chunks.
+    Since the field has no end, the game can be lost but never solved.
+    >>> game = ChunkedGame(seed=1)
+    >>> game.reveal(0, 0), len(game.changed)
+    (True, 51)
+    >>> game.reveal(5, 5)
+    False
+    >>> ChunkedGame(seed=1).hints[-1000, 1000] == game.hints[-1000, 1000]
+    True
+    """
+    def __init__(self, seed, density=0.15, chunk_size=32):
+        if not MIN_DENSITY <= density < 1:
+            raise ValueError('Density must be between {0} and 1 ({1})'.format(MIN_DENSITY, density))
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.mines_per_chunk = round(density*chunk_size*chunk_size)
+        self.mines = ChunkedTable(chunk_size, False, 'u1', self._generate_mines)
+        self.flags = ChunkedTable(chunk_size, Flags.Unknown, 'u1')
+        self.hints = ChunkedTable(chunk_size, 0, 'i1', self._generate_hints)
+        self.changed = []
+        self._count_fields()
+
+    def _generate_mines(self, cx, cy):
+        """Places the mines of a chunk with a random generator seeded from the chunk coordinates."""
+        size = self.chunk_size
+        rng = random.Random('{0}:{1}:{2}'.format(self.seed, cx, cy))
+        mines = Table(size, size, False, dtype='u1')
+        for i in rng.sample(range(size*size), self.mines_per_chunk):
+            mines[i] = True
+        return mines
+
+    def _generate_hints(self, cx, cy):
+        """Computes the hints of a chunk including the mines of the neighboring chunks."""
+        size = self.chunk_size
+        # the chunk's mines surrounded by the adjacent rows and columns of the neighboring chunks
+        padded = Table(size+2, size+2, False, dtype='u1')
+        # range copied from the neighboring chunk and its start in padded per direction
+        ranges = {-1: (slice(size-1, size), 0), 0: (slice(0, size), 1), 1: (slice(0, 1), size+1)}
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                columns, x = ranges[dx]
+                rows, y = ranges[dy]
+                region = self.mines.chunk(cx+dx, cy+dy)[columns, rows]
+                padded[x:x+region.num_columns, y:y+region.num_rows] = region
+        hints = compute_hints(padded)
+        return Table.from_list(size, size, hints[1:-1, 1:-1], dtype='i1')
+
+    def _count_fields(self):
+        self.num_mines = None
+        self.num_revealed_safe = 0
+        self.num_revealed_mines = 0
+        self.num_marked = 0
+        self.num_marked_mines = 0
+        for x, y, f in self.flags.cells():
+            m = self.mines[x, y]
+            if f == Flags.Revealed:
+                if m:
+                    self.num_revealed_mines += 1
+                else:
+                    self.num_revealed_safe += 1
+            elif f == Flags.Marked:
+                self.num_marked += 1
+                if m:
+                    self.num_marked_mines += 1
+
+    def _key(self, x, y):
+        """Returns the field itself, since the chunked tables are read with coordinates."""
+        return (x, y)
+
+    def _field(self, key):
+        return key
+
+    def _neighbor_lookup(self):
+        """Returns a function that returns the neighbors of a field as coordinates."""
+        neighbors = self.mines.neighbors
+        return lambda key: neighbors(*key)
+
+    def row_count(self):
+        """Returns None since the field is unbounded."""
+        return None
+
+    def column_count(self):
+        """Returns None since the field is unbounded."""
+        return None
+
+    def is_solved(self):
+        """Returns False since an unbounded field cannot be solved."""
+        return False
+
+    def remaining_mines(self):
+        """Returns None since the number of mines is unbounded."""
+        return None
+
+    def auto_mark(self):
+        """Does nothing since there are always more fields to reveal."""
+        return False
+
+    def reveal_all(self):
+        """Reveals all fields that are not marked in the chunks that were generated so far."""
+        self.changed = []
+        for x, y, _ in self.mines.cells():
+            if self.flags[x, y] == Flags.Unknown:
+                self._set_flag(x, y, Flags.Revealed)
+        if self.check_consistency:
+            self.check_counters()
@@ -0,0 +1,114 @@
+"""Generates the next boards in the background while a game is played"""
+
+import collections
+import threading
+import time
+from minesweeper import Game
+
+class BoardFactory:
+    """Keeps a small queue of ready games per kind of board.
+    A kind is a tuple of (columns, rows, number of mines). A background
+    thread fills the queues of all kinds that were requested or prefetched,
+    so take usually returns a finished game including its hints at once.
+    Only if the queue of a kind is empty, the game is generated while the
+    caller waits. The first field is not known in advance, so the caller
+    makes the first reveal safe with Game.move_mines_away.
+    If a game cannot be generated, the error is counted in the summary and
+    the kind is skipped by the thread until it is requested again.
+    The generator runs in a thread, since a game is cheap to share with it
+    and the interface mostly waits for input in the meantime.
+    """
+    def __init__(self, queue_size=2, create=Game.create_random):
+        self.queue_size = queue_size
+        self.create = create
+        self.queues = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.closed = False
+        # number of take calls that found a ready game or had to wait
+        self.hits = 0
+        self.misses = 0
+        # total time take waited for generated games
+        self.wait_seconds = 0.0
+        # number of games the background thread failed to generate and the last error
+        self.errors = 0
+        self.last_error = None
+        # kinds that failed and are skipped until they are requested again
+        self.failed = set()
+        self.thread = threading.Thread(target=self._run, name='BoardFactory', daemon=True)
+        self.thread.start()
+
+    def prefetch(self, columns, rows, num_mines):
+        """Starts generating games of a kind."""
+        with self.condition:
+            self.queues.setdefault((columns, rows, num_mines), collections.deque())
+            self.failed.discard((columns, rows, num_mines))
+            self.condition.notify()
+
+    def take(self, columns, rows, num_mines):
+        """Returns a new game of a kind, from the queue if possible, and refills the queue."""
+        kind = (columns, rows, num_mines)
+        with self.condition:
+            queue = self.queues.setdefault(kind, collections.deque())
+            game = queue.popleft() if queue else None
+            if game is not None:
+                self.hits += 1
+            self.failed.discard(kind)
+            self.condition.notify()
+        if game is None:
+            start = time.perf_counter()
+            game = self.create(columns, rows, num_mines)
+            with self.condition:
+                self.misses += 1
+                self.wait_seconds += time.perf_counter() - start
+        return game
+
+    def summary(self):
+        """Returns a dict with the number of hits, misses, the waiting time and the errors."""
+        with self.condition:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits/requests if requests else None,
+                'wait_seconds': self.wait_seconds,
+                'errors': self.errors,
+                'last_error': None if self.last_error is None else repr(self.last_error),
+            }
+
+    def close(self):
+        """Stops the background thread after the game it is generating."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+    def _missing(self):
+        """Returns a kind whose queue is not full or None."""
+        for kind, queue in self.queues.items():
+            if len(queue) < self.queue_size and kind not in self.failed:
+                return kind
+        return None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                kind = self._missing()
+                while kind is None and not self.closed:
+                    self.condition.wait()
+                    kind = self._missing()
+                if self.closed:
+                    return
+            try:
+                game = self.create(*kind)
+            except Exception as e:
+                # the kind is not generated again until it is requested,
+                # where the error is raised to the caller of take
+                with self.condition:
+                    self.errors += 1
+                    self.last_error = e
+                    self.failed.add(kind)
+                continue
+            with self.condition:
+                queue = self.queues[kind]
+                if len(queue) < self.queue_size:
+                    queue.append(game)
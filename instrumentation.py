@@ -0,0 +1,151 @@
+"""Measures where the time of a game and its rendering goes
+
+Instrumentation is opt-in: enable replaces the hot methods of the game
+classes with timing wrappers and disable restores the original methods, so
+a disabled build runs exactly the same code as one without this module.
+
+    stats = instrumentation.enable()
+    ...  # play, instrumentation.active is stats
+    print(stats.text())
+    with open('stats.jsonl', 'a') as f:
+        stats.dump(f)
+    instrumentation.disable()
+"""
+
+import functools
+import json
+import time
+from minesweeper import Game
+
+# methods of the game classes that are timed
+METHODS = ('reveal', 'toggle_mark', 'auto_mark', 'is_solved', 'is_lost')
+
+class Timing:
+    """Number of calls and their total and maximum duration."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total/self.count if self.count else 0.0
+
+    def summary(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.mean(), 'max': self.max}
+
+class Stats:
+    """Timings of the instrumented methods, the cascade sizes of reveal and the rendered frames.
+    >>> stats = Stats()
+    >>> stats.add_cascade(1)
+    >>> stats.add_cascade(300)
+    >>> stats.cascades
+    {1: 1, 512: 1}
+    >>> stats.add_frame(0.002, 40)
+    >>> stats.text()
+    'cascade max 300  frame 2.0ms 40 cells'
+    """
+    def __init__(self):
+        self.timings = {}
+        # number of reveals by the next power of 2 of the changed fields
+        self.cascades = {}
+        self.max_cascade = 0
+        self.frames = Timing()
+        self.cells = Timing()
+        self.last_frame = None
+
+    def add(self, name, seconds):
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = Timing()
+        timing.add(seconds)
+
+    def add_cascade(self, size):
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        self.cascades[bucket] = self.cascades.get(bucket, 0) + 1
+        self.max_cascade = max(self.max_cascade, size)
+
+    def add_frame(self, seconds, cells):
+        self.frames.add(seconds)
+        self.cells.add(cells)
+        self.last_frame = (seconds, cells)
+
+    def summary(self):
+        """Returns all statistics as a dict that can be stored as JSON."""
+        return {
+            'timings': {name: timing.summary() for name, timing in self.timings.items()},
+            'cascades': {str(size): count for size, count in sorted(self.cascades.items())},
+            'max_cascade': self.max_cascade,
+            'frames': self.frames.summary(),
+            'cells_drawn': self.cells.summary(),
+        }
+
+    def dump(self, f, **extra):
+        """Appends the summary with a timestamp and any extra values as a single JSON line to a text file."""
+        summary = self.summary()
+        summary.update(extra)
+        summary['time'] = time.time()
+        f.write(json.dumps(summary) + '\n')
+
+    def text(self):
+        """Returns a short line with the slowest method and the last frame."""
+        parts = []
+        if self.timings:
+            name, timing = max(self.timings.items(), key=lambda item: item[1].max)
+            parts.append('{0} {1}x max {2:.1f}ms'.format(name, timing.count, timing.max*1000))
+        if self.max_cascade:
+            parts.append('cascade max {0}'.format(self.max_cascade))
+        if self.last_frame is not None:
+            parts.append('frame {0:.1f}ms {1} cells'.format(self.last_frame[0]*1000, self.last_frame[1]))
+        return '  '.join(parts)
+
+# the Stats collecting the results while instrumentation is enabled
+active = None
+# the original methods of every instrumented class
+_originals = {}
+
+def _timed(stats, name, method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            stats.add(name, time.perf_counter() - start)
+            if name == 'reveal':
+                stats.add_cascade(len(self.changed))
+    return wrapper
+
+def enable(stats=None, classes=(Game,)):
+    """Starts timing the METHODS defined by the classes and returns the Stats that collect the results.
+    Subclasses that do not override a method are timed through their base class.
+    """
+    global active
+    disable()
+    if stats is None:
+        stats = Stats()
+    active = stats
+    for cls in classes:
+        originals = {}
+        for name in METHODS:
+            if name in cls.__dict__:
+                originals[name] = cls.__dict__[name]
+                setattr(cls, name, _timed(stats, name, cls.__dict__[name]))
+        _originals[cls] = originals
+    return stats
+
+def disable():
+    """Restores the original methods of all instrumented classes."""
+    global active
+    active = None
+    for cls, originals in _originals.items():
+        for name, method in originals.items():
+            setattr(cls, name, method)
+    _originals.clear()
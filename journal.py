@@ -0,0 +1,233 @@
+"""Records the moves of a minesweeper game in an append-only file
+
+A journal starts with the initial game in the savefile format followed by
+one record per move. A record is a single varint of the linear index of the
+field shifted left by 2 bits and the kind of the move in the lowest 2 bits.
+Every checkpoint_interval moves a checkpoint record stores the counters and
+the packed flags of the game, so a position can be restored from the last
+checkpoint before it instead of replaying all moves from the start.
+Restoring a snapshot of the game is a move of its own, recorded with the
+kind CHECKPOINT and the index RESTORE followed by the number of changed
+fields and a varint per field of its linear index shifted left by 2 bits
+and its new flag in the lowest 2 bits.
+Every record is flushed immediately, so after a crash the journal contains
+all moves up to the last one. An incomplete record at the end is ignored.
+"""
+
+from minesweeper import Game
+from table import Table, pack_bits, unpack_bits
+import savefile
+
+MAGIC = b'MSWJ'
+VERSION = 1
+
+# kinds of records
+REVEAL = 0
+REVEAL_UNKNOWN = 1 # reveal with reveal_known=False
+TOGGLE_MARK = 2
+CHECKPOINT = 3
+
+# index of a record of the kind CHECKPOINT that restores a snapshot
+RESTORE = 1
+
+def encode_varint(value):
+    """Encodes a non-negative integer with 7 bits per byte, lowest bits first.
+    >>> encode_varint(300)
+    b'\\xac\\x02'
+    """
+    data = bytearray()
+    while value >= 0x80:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+def decode_varint(data, offset):
+    """Returns the integer encoded at offset and the offset after it.
+    Raises an IndexError if the data ends within the integer.
+    >>> decode_varint(b'\\xac\\x02', 0)
+    (300, 2)
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return (value, offset)
+        shift += 7
+
+class Journal:
+    """Writes the moves of a game to an append-only file.
+    The journal is attached to the game, which reports every reveal,
+    toggle_mark and restore to it after the move was made.
+    """
+    def __init__(self, f, game, moves=0, checkpoint_interval=1000):
+        self.file = f
+        self.game = game
+        self.moves = moves
+        self.checkpoint_interval = checkpoint_interval
+        game.journal = self
+
+    @classmethod
+    def create(cls, path, game, checkpoint_interval=1000):
+        """Starts a new journal with the current state of a bounded game."""
+        initial = savefile.dumps(game)
+        f = open(path, 'wb')
+        f.write(MAGIC + bytes([VERSION]) + encode_varint(len(initial)) + initial)
+        f.flush()
+        return cls(f, game, 0, checkpoint_interval)
+
+    @classmethod
+    def resume(cls, path, checkpoint_interval=1000):
+        """Replays a journal and continues recording the moves of the returned journal's game.
+        An incomplete record at the end of the file is removed.
+        """
+        contents = read(path)
+        game = contents.replay()
+        f = open(path, 'r+b')
+        f.truncate(contents.length)
+        f.seek(contents.length)
+        return cls(f, game, len(contents.moves), checkpoint_interval)
+
+    def reveal(self, game, x, y, reveal_known):
+        self._record(REVEAL if reveal_known else REVEAL_UNKNOWN, x, y)
+
+    def toggle_mark(self, game, x, y):
+        self._record(TOGGLE_MARK, x, y)
+
+    def restore(self, game):
+        """Records a restored snapshot as the fields it changed and their new flags."""
+        flags = game.flags
+        # a field can change several times on the way to the snapshot
+        fields = dict.fromkeys(game.changed)
+        record = encode_varint(RESTORE << 2 | CHECKPOINT) + encode_varint(len(fields))
+        record += b''.join(encode_varint(flags.subscript_to_linear(x, y) << 2 | flags[x, y]) for x, y in fields)
+        self._write(record)
+
+    def _record(self, kind, x, y):
+        index = self.game.flags.subscript_to_linear(x, y)
+        self._write(encode_varint(index << 2 | kind))
+
+    def _write(self, record):
+        """Writes the record of a move and a checkpoint every checkpoint_interval moves."""
+        self.file.write(record)
+        self.moves += 1
+        if self.checkpoint_interval and self.moves % self.checkpoint_interval == 0:
+            self.checkpoint()
+        self.file.flush()
+
+    def checkpoint(self):
+        """Writes the current counters and flags of the game."""
+        game = self.game
+        flags = pack_bits(game.flags.tobytes(), 2)
+        record = encode_varint(CHECKPOINT)
+        for name in Game.COUNTERS:
+            record += encode_varint(getattr(game, name))
+        self.file.write(record + encode_varint(len(flags)) + flags)
+
+    def close(self):
+        """Stops recording and closes the file."""
+        if self.game.journal is self:
+            self.game.journal = None
+        self.file.close()
+
+class Contents:
+    """The parsed content of a journal file."""
+    def __init__(self, initial, moves, checkpoints, length):
+        # the initial game in the savefile format
+        self.initial = initial
+        # list of (kind, linear index) of all moves, (CHECKPOINT, list of (linear index, flag)) for a restore
+        self.moves = moves
+        # list of (number of moves, counters, packed flags)
+        self.checkpoints = checkpoints
+        # number of bytes up to the end of the last complete record
+        self.length = length
+
+    def replay(self, move=None):
+        """Returns the game after the first move moves or after all moves if move is None.
+        The game starts at the last checkpoint before the move, so only the
+        moves after the checkpoint are made again.
+        """
+        if move is None:
+            move = len(self.moves)
+        if not 0 <= move <= len(self.moves):
+            raise IndexError('Journal has no move {0}'.format(move))
+
+        initial = savefile.loads(self.initial)
+        columns, rows = initial.column_count(), initial.row_count()
+        mines = Table.from_list(columns, rows, initial.mines.tobytes(), dtype='u1')
+        flags = initial.flags.tobytes()
+        counters = {name: getattr(initial, name) for name in Game.COUNTERS}
+        start = 0
+        for moves, checkpoint_counters, packed_flags in self.checkpoints:
+            if moves <= move:
+                start = moves
+                counters = checkpoint_counters
+                flags = unpack_bits(packed_flags, 2, columns*rows)
+        flags = Table.from_list(columns, rows, flags, dtype='u1')
+        game = Game._from_tables(mines, flags, initial.hints, counters)
+
+        for kind, index in self.moves[start:move]:
+            if kind == CHECKPOINT:
+                for i, flag in index:
+                    game._set_flag(*flags.linear_to_subscript(i), flag)
+                continue
+            x, y = flags.linear_to_subscript(index)
+            if kind == TOGGLE_MARK:
+                game.toggle_mark(x, y)
+            else:
+                game.reveal(x, y, reveal_known=kind == REVEAL)
+        return game
+
+def read(path):
+    """Parses a journal file and returns its Contents."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a minesweeper journal')
+    try:
+        if data[len(MAGIC)] > VERSION:
+            raise ValueError('Unsupported journal version {0}'.format(data[len(MAGIC)]))
+        size, offset = decode_varint(data, len(MAGIC) + 1)
+    except IndexError:
+        raise ValueError('Journal is truncated') from None
+    initial = data[offset:offset+size]
+    if len(initial) != size:
+        raise ValueError('Journal is truncated')
+    offset += size
+
+    moves = []
+    checkpoints = []
+    length = offset
+    try:
+        while offset < len(data):
+            value, offset = decode_varint(data, offset)
+            kind, index = value & 3, value >> 2
+            if kind == CHECKPOINT and index == RESTORE:
+                count, offset = decode_varint(data, offset)
+                changes = []
+                for _ in range(count):
+                    value, offset = decode_varint(data, offset)
+                    changes.append((value >> 2, value & 3))
+                moves.append((kind, changes))
+            elif kind == CHECKPOINT:
+                counters = {}
+                for name in Game.COUNTERS:
+                    counters[name], offset = decode_varint(data, offset)
+                size, offset = decode_varint(data, offset)
+                if offset + size > len(data):
+                    break
+                checkpoints.append((len(moves), counters, data[offset:offset+size]))
+                offset += size
+            else:
+                moves.append((kind, index))
+            length = offset
+    except IndexError:
+        pass # incomplete record at the end
+    return Contents(initial, moves, checkpoints, length)
+
+def replay(path, move=None):
+    """Returns the game recorded in a journal after the given number of moves or after all moves."""
+    return read(path).replay(move)
@@ -1,36 +1,240 @@
 """A minesweeper game"""
 
+import io
+import itertools
+import operator
 import random
-from enum import Enum
-from table import Table
+import sys
+from array import array
+from enum import IntEnum
+from table import Table, border_case, neighbor_offsets
 
-class Flags(Enum):
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# compute the hints with numpy if it is available
+USE_NUMPY = numpy is not None
+
+class Flags(IntEnum):
     Unknown = 0
     Marked = 1
     Revealed = 2
 
+# characters of the fields by flag, indexed by the hint (-1 is the last one for mines)
+# what a player sees: '?' Unknown, '!' Marked, '*' a revealed mine or the hint
+TEXT_GLYPHS = ('??????????', '!!!!!!!!!!', '012345678*')
+# the complete board: '.' Unknown, 'f' Marked and the hint of revealed fields
+# for fields without a mine and 'x', 'F', 'X' for the same with a mine
+BOARD_GLYPHS = ('.........x', 'fffffffffF', '012345678X')
+# the board characters translated to the mines and to the flags
+_BOARD_MINES = str.maketrans('.xfFX012345678', '\x00\x01\x00\x01\x01' + '\x00'*9)
+_BOARD_FLAGS = str.maketrans('.xfFX012345678', '\x00\x00\x01\x01\x02' + '\x02'*9)
+
+def compute_hints(mines, use_numpy=None):
+    """Returns a table with the number of neighboring mines of each field
+    and -1 for the fields that are mines.
+    If use_numpy is None, numpy is used if USE_NUMPY is set.
+    >>> compute_hints(Table.from_nested_list([[True, False, False], [False, False, True]]))
+    Table 3x2:
+    [-1, 2, 1]
+    [1, 2, -1]
+    """
+    if use_numpy is None:
+        use_numpy = USE_NUMPY
+    if use_numpy:
+        hints = _compute_hints_numpy(mines.size(), mines.tobytes())
+    else:
+        hints = _compute_hints_python(mines.size(), mines.tobytes())
+    return Table.from_list(mines.num_columns, mines.num_rows, hints, dtype='i1')
+
+def _compute_hints_numpy(size, mines):
+    """Computes the hints as a sum over the 3x3 neighborhood of the padded mine array."""
+    columns, rows = size
+    m = (numpy.frombuffer(mines, dtype=numpy.uint8) != 0).astype(numpy.int8).reshape(rows, columns)
+    padded = numpy.pad(m, 1)
+    s = numpy.zeros((rows, columns), dtype=numpy.int8)
+    for dy in range(3):
+        for dx in range(3):
+            s += padded[dy:dy+rows, dx:dx+columns]
+    return numpy.where(m != 0, -1, s).astype(numpy.int8).tobytes()
+
+def _compute_hints_python(size, mines):
+    """Computes the hints row by row.
+    For every row the sum of each three horizontally adjacent fields is
+    computed from the prefix sums of the row. The hint is then the sum of
+    these values from the row above, the row itself and the row below.
+    Since a field that is not a mine adds nothing to the sum, there is
+    no need to subtract the field itself.
+    """
+    columns, rows = size
+    hints = array('b')
+
+    def horizontal(y):
+        if y < 0 or y >= rows:
+            return itertools.repeat(0, columns)
+        row = mines[y*columns:(y+1)*columns]
+        prefix = list(itertools.accumulate(itertools.chain((0,), row, (0,)), initial=0))
+        return [b - a for a, b in zip(prefix, prefix[3:])]
+
+    above, current = horizontal(-1), horizontal(0)
+    for y in range(rows):
+        below = horizontal(y+1)
+        row = mines[y*columns:(y+1)*columns]
+        hints.extend([-1 if m else a+b+c for m, a, b, c in zip(row, above, current, below)])
+        above, current = current, below
+    return hints
+
+def storage(table):
+    """Returns an object that reads and writes the cells of a bounded table by linear index.
+    This is the storage itself for plain tables, which skips the key handling of Table.
+    """
+    return table.table if type(table) is Table else table
+
 class Game:
     """Playing field of the minesweeper game.
     The game provides three tables:
     1. The mines table indicate if a field contains a mine
     2. The flags table holds which fields are Unknown, Marked or Revealed
     3. The hints table holds a pre-computed number of surrounding mines for each field
+
+    The game keeps counters of revealed and marked fields, so the flags
+    table must only be changed through the methods of the game.
+    If check_consistency is set, the counters are compared against a full
+    scan of the tables after every action.
+
+    Tables created by the game use compact typed storage, so the flags
+    table holds the ordinals of Flags rather than the enum members.
+    Since Flags is an IntEnum, both compare equal.
     """
 
+    check_consistency = False
+    # receives every reveal, toggle_mark and restore, e.g. a journal.Journal
+    journal = None
+    # counters that are updated with every changed flag
+    COUNTERS = ('num_mines', 'num_revealed_safe', 'num_revealed_mines', 'num_marked', 'num_marked_mines')
+    # flag changes as (x, y, old flag, new flag), recorded from the first snapshot on
+    _history = None
+    # number of changes in the history that are applied to the flags
+    _history_position = 0
+
     def __init__(self, mines, flags=None):
         """Generates a Game from a given mine configuration.
         If flags is None, it will be initialized with Unknown.
         """
         if flags is None:
-            flags = Table(mines.num_columns, mines.num_rows, Flags.Unknown)
+            flags = Table(mines.num_columns, mines.num_rows, Flags.Unknown, dtype='u1')
         if mines.size() != flags.size():
             raise ValueError('Fields cannot have different sizes ({0} != {1})'.format(mines.size(), flags.size()))
         self.mines = mines
         self.flags = flags
-        self.hints = Table(mines.num_columns, mines.num_rows, 0)
+        self.hints = compute_hints(mines)
+        # fields changed by the last reveal, toggle_mark or reveal_all
+        self.changed = []
+        self._count_fields()
+
+    def _count_fields(self):
+        """Initializes the counters that are updated with every changed flag."""
+        self.num_mines = self.mines.count(True)
+        self.num_revealed_safe = 0
+        self.num_revealed_mines = 0
+        self.num_marked = 0
+        self.num_marked_mines = 0
+        if self.flags.count(Flags.Unknown) == self.flags.num_columns*self.flags.num_rows:
+            return
+        for m, f in zip(self.mines, self.flags):
+            if f == Flags.Revealed:
+                if m:
+                    self.num_revealed_mines += 1
+                else:
+                    self.num_revealed_safe += 1
+            elif f == Flags.Marked:
+                self.num_marked += 1
+                if m:
+                    self.num_marked_mines += 1
 
-        for i, _ in enumerate(self.hints):
-            self.hints[i] = self.hint(*self.hints.linear_to_subscript(i))
+    def check_counters(self):
+        """Compares the counters against a full scan of the tables.
+        Raises an AssertionError if any of them does not match.
+        """
+        current = [getattr(self, name) for name in self.COUNTERS]
+        self._count_fields()
+        expected = [getattr(self, name) for name in self.COUNTERS]
+        for name, c, e in zip(self.COUNTERS, current, expected):
+            if c != e:
+                raise AssertionError('Counter {0} is {1} but should be {2}'.format(name, c, e))
+
+    @classmethod
+    def _from_tables(cls, mines, flags, hints, counters):
+        """Creates a game from existing tables and a dict of counters without scanning the tables."""
+        game = cls.__new__(cls)
+        game.mines = mines
+        game.flags = flags
+        game.hints = hints
+        game.changed = []
+        for name in cls.COUNTERS:
+            setattr(game, name, counters[name])
+        return game
+
+    def save(self, path, hints=False):
+        """Writes the game to a file in the format of the savefile module.
+        If hints is set, the hints are stored as well, so that loading does not need to compute them.
+        """
+        import savefile
+        savefile.save(self, path, hints)
+
+    @classmethod
+    def load(cls, path, use_mmap=True):
+        """Reads a game written by save.
+        If use_mmap is set, the file is memory mapped and only the parts that are accessed are read.
+        Changes to the game are never written back to the file.
+        """
+        import savefile
+        return savefile.load(path, use_mmap, cls)
+
+    def snapshot(self):
+        """Returns a snapshot of the flags that restore can return to.
+        Snapshots do not copy any table. Instead, the game records every
+        changed flag from the first snapshot on, so a snapshot is a position
+        in this history and the memory grows only with the changed fields.
+        Snapshots taken after a restored one become invalid once the flags
+        are changed by a move, like redo after a new move.
+        """
+        if self._history is None:
+            self._history = []
+            self._history_position = 0
+        return self._history_position
+
+    def restore(self, snapshot):
+        """Returns the flags and counters to the state of a snapshot.
+        Only the fields changed since the snapshot are visited, which can be
+        done backwards (undo) as well as forwards to a later snapshot (redo).
+        Afterwards, the changed list contains all fields whose flag was changed.
+        """
+        history = self._history
+        if history is None or not 0 <= snapshot <= len(history):
+            raise ValueError('Invalid snapshot {0}'.format(snapshot))
+        self.changed = []
+        position = self._history_position
+        # the changes made here must not be recorded
+        self._history = None
+        try:
+            while position > snapshot:
+                position -= 1
+                x, y, old, new = history[position]
+                self._set_flag(x, y, old)
+            while position < snapshot:
+                x, y, old, new = history[position]
+                self._set_flag(x, y, new)
+                position += 1
+        finally:
+            self._history = history
+            self._history_position = position
+        if self.journal is not None:
+            self.journal.restore(self)
+        if self.check_consistency:
+            self.check_counters()
 
     def row_count(self):
         """Returns the vertical size of the field."""
@@ -46,118 +250,365 @@ class Game:
         if self.mines[x, y]:
             return -1
         else:
-            h = 0
-            for a, b in self.mines.neighbors(x, y):
-                if(self.mines[a, b]):
-                    h += 1
-            return h
+            mines = storage(self.mines)
+            return sum(1 for n in self._neighbor_lookup()(self._key(x, y)) if mines[n])
+
+    def _key(self, x, y):
+        """Returns the key of a field in the storage of the tables, which is its linear index."""
+        return x + y*self.flags.num_columns
+
+    def _field(self, key):
+        """Returns the field (column, row) of a key."""
+        return (key % self.flags.num_columns, key // self.flags.num_columns)
+
+    def _neighbor_lookup(self):
+        """Returns a function that returns an iterable of the keys of the neighbors of a key.
+        The neighbors are found with the cached offsets of the table shape
+        instead of generating coordinates.
+        """
+        columns, rows = self.flags.num_columns, self.flags.num_rows
+        offsets = neighbor_offsets(columns, rows)
+        def neighbors(i):
+            return map(i.__add__, offsets[border_case(i, columns, rows)])
+        return neighbors
 
     def is_solved(self):
         """Returns true if all mines are flagged."""
-        for m, f in zip(self.mines, self.flags):
-            # if any mine is not marked, the game is not solved
-            if m and f != Flags.Marked:
-                return False
-        return True
+        return self.num_marked_mines == self.num_mines
 
     def is_lost(self):
         """Returns true if a mine is revealed and the game is lost."""
-        for m, f in zip(self.mines, self.flags):
-            if m and f == Flags.Revealed:
-                return True
-        return False
+        return self.num_revealed_mines > 0
+
+    def remaining_mines(self):
+        """Returns the number of mines minus the number of marked fields."""
+        return self.num_mines - self.num_marked
 
     def auto_mark(self):
         """Marks all mines and reveals all fields but only if all non-mine fields are already revealed."""
-        for m, f in zip(self.mines, self.flags):
-            # check if all non-mine fields are revealed
-            if not m and f != Flags.Revealed:
-                return False
-
-        # mark all mines and reveal remaining flields
-        for i, m in enumerate(self.mines):
-            if m:
-                self.flags[i] = Flags.Marked
-            else:
-                self.flags[i] = Flags.Revealed
+        num_fields = self.mines.num_columns*self.mines.num_rows
+        if self.num_revealed_safe != num_fields - self.num_mines:
+            return False
+
+        # all safe fields are revealed, so only the mines can be left to mark;
+        # the bytes are searched for them instead of visiting every field
+        mines = self.mines.tobytes()
+        i = mines.find(1)
+        while i >= 0:
+            x, y = self.flags.linear_to_subscript(i)
+            if self.flags[x, y] != Flags.Marked:
+                self._set_flag(x, y, Flags.Marked)
+            i = mines.find(1, i + 1)
 
     def reveal_all(self):
         """Reveals all fields that are not marked."""
-        for i, f in enumerate(self.flags):
-            if f != Flags.Marked:
-                self.flags[i] = Flags.Revealed
+        self.changed = []
+        flags = self.flags.tobytes()
+        i = flags.find(Flags.Unknown)
+        while i >= 0:
+            self._set_flag(*self.flags.linear_to_subscript(i), Flags.Revealed)
+            i = flags.find(Flags.Unknown, i + 1)
+        if self.check_consistency:
+            self.check_counters()
 
     def reveal(self, x, y, reveal_known=True):
         """Reveals a fields.
-        Returns False if the revealed field was a mine field, True otherwise.
-        If the revealed field has no neighboring mines all neighboring fields are revealed recursively.
+        Returns False if a mine field was revealed, True otherwise.
+        If the revealed field has no neighboring mines all neighboring fields are revealed
+        as well, which continues through the whole connected region of such fields.
         Revealing a Marked field resets it to Unknown again.
         If reveal_known is set, the field is already revealed and the number of
         flagged neighbors is equal to the hint, all non-flagged fields around
         the field are revealed as well.
+        Afterwards, the changed list contains all fields whose flag was changed.
         """
+        self.changed = []
+        ok = self._reveal(x, y, reveal_known)
+        if self.journal is not None:
+            self.journal.reveal(self, x, y, reveal_known)
+        if self.check_consistency:
+            self.check_counters()
+        return ok
+
+    def _reveal(self, x, y, reveal_known):
+        """Implements reveal without resetting the changed list."""
         if self.flags[x, y] == Flags.Marked:
-            self.flags[x, y] = Flags.Unknown
+            self._set_flag(x, y, Flags.Unknown)
+            return True
         elif self.flags[x, y] == Flags.Revealed:
             if self.hints[x, y] <= 0 or not reveal_known:
                 return True
-            neighbors = list(self.mines.neighbors(x, y))
-            neighbor_mines = [(nx, ny) for nx, ny in neighbors if self.flags[nx, ny] == Flags.Marked]
-            if len(neighbor_mines) == self.hints[x, y]:
-                for nx, ny in neighbors:
-                    if (nx, ny) not in neighbor_mines:
-                        # don't reveal fields recursively
-                        self.reveal(nx, ny, reveal_known=False)
+            fields = self._chord_fields(x, y)
+            if fields is None:
+                return True
         else:
-            self.flags[x, y] = Flags.Revealed
-            if self.mines[x, y]:
-                return False
-            else:
-                if self.hint(x, y) == 0:
-                    for nx, ny in self.mines.neighbors(x, y):
-                        if self.flags[nx, ny] == Flags.Unknown:
-                            ok = self.reveal(nx, ny, reveal_known=False)
-                            assert ok # must not be surrounded by any mines
-                self.auto_mark()
-        return True
+            fields = [(x, y)]
+
+        ok = self._flood_fill(fields)
+        if ok and self.changed:
+            self.auto_mark()
+        return ok
+
+    def _chord_fields(self, x, y):
+        """Returns the Unknown neighbors of a revealed field or None if the
+        number of its Marked neighbors is not equal to its hint.
+        """
+        flags, field = storage(self.flags), self._field
+        neighbors = list(self._neighbor_lookup()(self._key(x, y)))
+        if sum(1 for n in neighbors if flags[n] == Flags.Marked) != self.hints[x, y]:
+            return None
+        return [field(n) for n in neighbors if flags[n] == Flags.Unknown]
+
+    def _flood_fill(self, fields):
+        """Reveals the Unknown fields and continues with the neighbors of all
+        revealed fields that have no neighboring mines.
+        Every field is only visited once since it is revealed before it is queued.
+        Returns False if any of the fields was a mine.
+        The queue holds the keys of the fields, whose neighbors are found with
+        the function of _neighbor_lookup.
+        """
+        flags, mines, hints = storage(self.flags), storage(self.mines), storage(self.hints)
+        neighbors, key, field = self._neighbor_lookup(), self._key, self._field
+        set_flag = self._set_flag
+        unknown, revealed = Flags.Unknown, Flags.Revealed
+        ok = True
+        queue = []
+        for x, y in fields:
+            k = key(x, y)
+            if flags[k] == unknown:
+                set_flag(x, y, revealed)
+                queue.append(k)
+        while queue:
+            i = queue.pop()
+            if mines[i]:
+                ok = False
+            elif hints[i] == 0:
+                for n in neighbors(i):
+                    if flags[n] == unknown:
+                        set_flag(*field(n), revealed)
+                        queue.append(n)
+        return ok
 
     def toggle_mark(self, x, y):
         """Toggles the mark of a field.
         If the field is Unknown it becomes Marked and vice versa.
         Does nothing on Revealed fields.
+        Afterwards, the changed list contains all fields whose flag was changed.
         """
+        self.changed = []
         if self.flags[x, y] == Flags.Unknown:
-            self.flags[x, y] = Flags.Marked
+            self._set_flag(x, y, Flags.Marked)
         elif self.flags[x, y] == Flags.Marked:
-            self.flags[x, y] = Flags.Unknown
+            self._set_flag(x, y, Flags.Unknown)
         self.auto_mark()
+        if self.journal is not None:
+            self.journal.toggle_mark(self, x, y)
+        if self.check_consistency:
+            self.check_counters()
+
+    def _set_flag(self, x, y, flag):
+        """Changes the flag of a field, updates the counters and records it in the changed list."""
+        key = self._key(x, y)
+        flags = storage(self.flags)
+        old = flags[key]
+        if old == flag:
+            return
+        mine = storage(self.mines)[key]
+        if old == Flags.Revealed:
+            if mine:
+                self.num_revealed_mines -= 1
+            else:
+                self.num_revealed_safe -= 1
+        elif old == Flags.Marked:
+            self.num_marked -= 1
+            if mine:
+                self.num_marked_mines -= 1
+        if flag == Flags.Revealed:
+            if mine:
+                self.num_revealed_mines += 1
+            else:
+                self.num_revealed_safe += 1
+        elif flag == Flags.Marked:
+            self.num_marked += 1
+            if mine:
+                self.num_marked_mines += 1
+        flags[key] = flag
+        self.changed.append((x, y))
+        history = self._history
+        if history is not None:
+            # a new change discards the changes that were undone
+            if self._history_position != len(history):
+                del history[self._history_position:]
+            history.append((x, y, old, flag))
+            self._history_position += 1
+
+    def write_text(self, f, board=False):
+        """Writes the fields row by row to a text file.
+        Without board, the fields are written as a player sees them (TEXT_GLYPHS).
+        With board, the mines are written as well (BOARD_GLYPHS), which can be read with from_text.
+        >>> game = Game(Table.from_nested_list([[False, True, False]]))
+        >>> game.reveal(0, 0)
+        True
+        >>> game.toggle_mark(1, 0)
+        >>> game.write_text(sys.stdout)
+        1!?
+        >>> game.write_text(sys.stdout, board=True)
+        1F.
+        """
+        glyphs = BOARD_GLYPHS if board else TEXT_GLYPHS
+        for y in range(self.row_count()):
+            # the glyphs of the flag of each field indexed by its hint
+            f.write(''.join(map(operator.getitem, map(glyphs.__getitem__, self.flags.row(y)), self.hints.row(y))))
+            f.write('\n')
+
+    def to_text(self, board=False):
+        """Returns the text written by write_text."""
+        f = io.StringIO()
+        self.write_text(f, board)
+        return f.getvalue()
 
     def print_field(self):
-        s = ''
-        for y in range(self.mines.num_rows):
-            for x in range(self.mines.num_columns):
-                f, m = self.flags[x, y], self.mines[x, y]
-                if f == Flags.Unknown:
-                    s += '?'
-                elif f == Flags.Marked:
-                    s += '!'
-                elif f == Flags.Revealed:
-                    if m:
-                        s += '*'
-                    else:
-                        s += str(self.hint(x, y))
-            s += '\n'
-        print(s)
+        self.write_text(sys.stdout)
 
     @classmethod
-    def create_random(cls, columns, rows, number_of_mines):
-        """Generates a Grid of variable size and a specific number of randomly placed mines."""
-        mines = Table(columns, rows, False)
-        flags = Table(columns, rows, Flags.Unknown)
-
-        # indices of all fields
-        fields = [(c, r) for c in range(columns) for r in range(rows)]
-        # pick numMines random indices from the grid and assign them as mines
-        for x, y in random.sample(fields, number_of_mines):
-            mines[x, y] = True
-        return Game(mines, flags)
+    def from_text(cls, text):
+        """Creates a game from the board text written by write_text(f, board=True).
+        Empty lines and surrounding whitespace are ignored. Raises a ValueError
+        if the text contains other characters, rows of different length or
+        hints that do not match the mines.
+        >>> game = Game.from_text('''
+        ...     2F.
+        ...     .x.
+        ... ''')
+        >>> game.remaining_mines()
+        1
+        >>> print(game.to_text(), end='')
+        2!?
+        ???
+        >>> Game.from_text('2x')
+        Traceback (most recent call last):
+        ...
+        ValueError: Row 0 is '2x' but the mines give '1x'
+        """
+        lines = [line.strip() for line in text.splitlines()]
+        lines = [line for line in lines if line]
+        if not lines:
+            raise ValueError('Board text contains no fields')
+        columns, rows = len(lines[0]), len(lines)
+        if any(len(line) != columns for line in lines):
+            raise ValueError('Rows cannot have different length')
+        fields = ''.join(lines)
+        invalid = set(fields) - set(BOARD_GLYPHS[0] + BOARD_GLYPHS[1] + BOARD_GLYPHS[2])
+        if invalid:
+            raise ValueError('Invalid characters {0!r} in board text'.format(''.join(sorted(invalid))))
+        mines = fields.translate(_BOARD_MINES).encode('latin-1')
+        flags = fields.translate(_BOARD_FLAGS).encode('latin-1')
+        game = cls(Table.from_list(columns, rows, mines, dtype='u1'), Table.from_list(columns, rows, flags, dtype='u1'))
+        written = game.to_text(board=True).splitlines()
+        for y, (line, expected) in enumerate(zip(lines, written)):
+            if line != expected:
+                raise ValueError('Row {0} is {1!r} but the mines give {2!r}'.format(y, line, expected))
+        return game
+
+    def move_mines_away(self, x, y, seed=None):
+        """Moves the mines on a field and its neighbors to random fields outside of them.
+        A board generated in advance becomes as safe for its first reveal as
+        one created with create_random(safe=(x, y)). Only the hints around the
+        moved mines are computed again. Raises a ValueError if a field was
+        already revealed or marked or if there are not enough free fields.
+        """
+        if self.num_revealed_safe or self.num_revealed_mines or self.num_marked:
+            raise ValueError('Mines can only be moved before the first move')
+        mines = self.mines
+        start = mines.subscript_to_linear(x, y)
+        excluded = set([start] + mines.neighbor_indices(start))
+        cells = storage(mines)
+        moved = [i for i in excluded if cells[i]]
+        if not moved:
+            return
+        num_fields = mines.num_columns*mines.num_rows
+        available = num_fields - len(excluded) - (self.num_mines - len(moved))
+        if available < len(moved):
+            raise ValueError('Cannot move {0} mines to {1} fields'.format(len(moved), available))
+
+        for i in moved:
+            cells[i] = 0
+        rng = random.Random(seed)
+        targets = []
+        while len(targets) < len(moved):
+            i = int(rng.random()*num_fields)
+            if not cells[i] and i not in excluded:
+                cells[i] = 1
+                targets.append(i)
+
+        self._update_hints(set(n for j in moved + targets for n in [j] + mines.neighbor_indices(j)))
+
+    def _update_hints(self, indices):
+        """Computes the hints of the fields with the given linear indices again after the mines changed."""
+        hints = storage(self.hints)
+        for i in indices:
+            hints[i] = self.hint(*self.mines.linear_to_subscript(i))
+
+    @classmethod
+    def create_random(cls, columns, rows, number_of_mines, seed=None, safe=None):
+        """Generates a Grid of variable size and a specific number of randomly placed mines.
+        The same seed always generates the same mines.
+        If safe is a field (column, row), neither the field nor its neighbors contain a mine,
+        so revealing it first can neither lose the game nor show only a single hint.
+        """
+        return cls(place_mines(columns, rows, number_of_mines, seed, safe))
+
+def place_mines(columns, rows, number_of_mines, seed=None, safe=None):
+    """Returns a mines table with randomly placed mines.
+    Mines are placed by drawing random linear indices until enough free fields
+    were hit, so no list of all fields is allocated. If more than half of the
+    fields are mines, the free fields are drawn instead.
+    If safe is a field (column, row), the field and its neighbors are excluded.
+    >>> mines = place_mines(5, 4, 11, seed=1, safe=(0, 0))
+    >>> mines.count(True)
+    11
+    >>> mines[0, 0] or mines[1, 0] or mines[0, 1] or mines[1, 1]
+    0
+    >>> mines == place_mines(5, 4, 11, seed=1, safe=(0, 0))
+    True
+    >>> place_mines(3, 3, 1, safe=(1, 1))
+    Traceback (most recent call last):
+    ...
+    ValueError: Cannot place 1 mines on 0 fields
+    >>> place_mines(5, 5, 1, safe=(9, 9))
+    Traceback (most recent call last):
+    ...
+    IndexError: Safe field (9, 9) is outside of the board
+    """
+    rng = random.Random(seed)
+    mines = Table(columns, rows, False, dtype='u1')
+    num_fields = columns*rows
+
+    excluded = set()
+    if safe is not None:
+        if not (0 <= safe[0] < columns and 0 <= safe[1] < rows):
+            raise IndexError('Safe field {0} is outside of the board'.format(tuple(safe)))
+        excluded.add(mines.subscript_to_linear(*safe))
+        excluded.update(mines.subscript_to_linear(x, y) for x, y in mines.neighbors(*safe))
+    available = num_fields - len(excluded)
+    if number_of_mines < 0 or number_of_mines > available:
+        raise ValueError('Cannot place {0} mines on {1} fields'.format(number_of_mines, available))
+
+    if number_of_mines <= available//2:
+        # set random fields until enough mines are placed
+        value, count = 1, number_of_mines
+    else:
+        # fill all fields and clear random fields until enough are free
+        mines.table = array('B', [1])*num_fields
+        for i in excluded:
+            mines.table[i] = 0
+        value, count = 0, available - number_of_mines
+
+    table = mines.table
+    random_value = rng.random
+    while count > 0:
+        i = int(random_value()*num_fields)
+        if table[i] != value and i not in excluded:
+            table[i] = value
+            count -= 1
+    return mines
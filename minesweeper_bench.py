@@ -0,0 +1,275 @@
+"""Benchmarks for the hot paths of the minesweeper game
+
+Every benchmark runs for each board size and reports the best time of a
+number of repetitions. Results can be written as JSON and compared against
+a stored baseline:
+
+    python minesweeper_bench.py --large --output baseline.json
+    python minesweeper_bench.py --large --compare baseline.json --threshold 0.2
+
+The comparison fails with exit code 1 if any benchmark got slower than the
+baseline by more than the threshold. With --large, the benchmarks also run
+on the boards of 4000x4000 and 5000x5000 fields that the optimizations of
+the large boards were measured on.
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import time
+import minesweeper
+import bitboard
+from table import Table
+from minesweeper_sim import parse_size
+
+# board sizes of the benchmarks
+SIZES = [(100, 100), (300, 300), (1000, 1000)]
+# board sizes added by --large
+LARGE_SIZES = [(4000, 4000), (5000, 5000)]
+
+def random_mines(columns, rows, density, seed=0):
+    """Returns a typed mines table with the given fraction of mines."""
+    return minesweeper.place_mines(columns, rows, int(columns*rows*density), seed=seed)
+
+def sample_fields(columns, rows, count=100000, seed=0):
+    """Returns up to count random fields of the board."""
+    rng = random.Random(seed)
+    if columns*rows <= count:
+        return [(x, y) for y in range(rows) for x in range(columns)]
+    return [(rng.randrange(columns), rng.randrange(rows)) for _ in range(count)]
+
+class FakeScreen:
+    """Stands in for a curses window and only counts the drawn strings."""
+    def __init__(self):
+        self.calls = 0
+
+    def addstr(self, *args):
+        self.calls += 1
+
+# Every benchmark takes the board size and returns a tuple of a setup function,
+# the measured function, which is called with the result of setup, and the
+# number of operations the measured function performs.
+
+def bench_table_getitem(columns, rows):
+    table = Table(columns, rows, 0, dtype='u1')
+    fields = sample_fields(columns, rows)
+    def run(_):
+        for field in fields:
+            table[field]
+    return (None, run, len(fields))
+
+def bench_table_setitem(columns, rows):
+    table = Table(columns, rows, 0, dtype='u1')
+    fields = sample_fields(columns, rows)
+    def run(_):
+        for field in fields:
+            table[field] = 1
+    return (None, run, len(fields))
+
+def bench_table_neighbors(columns, rows):
+    table = Table(columns, rows, 0, dtype='u1')
+    fields = sample_fields(columns, rows)
+    def run(_):
+        for x, y in fields:
+            for _ in table.neighbors(x, y):
+                pass
+    return (None, run, len(fields))
+
+def bench_table_neighbor_indices(columns, rows):
+    table = Table(columns, rows, 0, dtype='u1')
+    indices = [table.subscript_to_linear(x, y) for x, y in sample_fields(columns, rows)]
+    def run(_):
+        for i in indices:
+            for _ in table.neighbor_indices(i):
+                pass
+    return (None, run, len(indices))
+
+def bench_table_iter(columns, rows):
+    table = Table(columns, rows, 0, dtype='u1')
+    def run(_):
+        for _ in table:
+            pass
+    return (None, run, columns*rows)
+
+def bench_game_init(columns, rows):
+    mines = random_mines(columns, rows, 0.1)
+    return (None, lambda _: minesweeper.Game(mines), columns*rows)
+
+def bench_game_init_python(columns, rows):
+    mines = random_mines(columns, rows, 0.1)
+    def run(_):
+        previous = minesweeper.USE_NUMPY
+        minesweeper.USE_NUMPY = False
+        try:
+            minesweeper.Game(mines)
+        finally:
+            minesweeper.USE_NUMPY = previous
+    return (None, run, columns*rows)
+
+def bench_create_random(columns, rows):
+    num_mines = int(columns*rows*0.2)
+    safe = (columns//2, rows//2)
+    return (None, lambda _: minesweeper.Game.create_random(columns, rows, num_mines, seed=1, safe=safe), columns*rows)
+
+def bench_reveal_cascade(columns, rows, cls=minesweeper.Game):
+    # few mines, so revealing the center opens most of the board
+    mines = random_mines(columns, rows, 0.001)
+    x, y = columns//2, rows//2
+    mines[x, y] = False
+    def setup():
+        return cls(mines)
+    def run(game):
+        game.reveal(x, y)
+    return (setup, run, columns*rows)
+
+def bench_reveal_cascade_bitboard(columns, rows):
+    return bench_reveal_cascade(columns, rows, bitboard.BitboardGame)
+
+def bench_reveal_single(columns, rows, cls=minesweeper.Game):
+    # the most common move: a single field with a hint near the end of the board
+    mines = random_mines(columns, rows, 0.2)
+    x, y = columns - 1, rows - 1
+    mines[x, y] = False
+    mines[x - 1 if columns > 1 else x, y - 1 if rows > 1 else y] = True
+    def setup():
+        return cls(mines)
+    def run(game):
+        game.reveal(x, y)
+    return (setup, run, 1)
+
+def bench_reveal_single_bitboard(columns, rows):
+    return bench_reveal_single(columns, rows, bitboard.BitboardGame)
+
+def bench_status(columns, rows):
+    game = minesweeper.Game(random_mines(columns, rows, 0.1))
+    def run(_):
+        for _ in range(1000):
+            game.is_solved()
+            game.is_lost()
+    return (None, run, 1000)
+
+def bench_write_text(columns, rows):
+    game = minesweeper.Game(random_mines(columns, rows, 0.1))
+    game.reveal_all()
+    return (io.StringIO, lambda f: game.write_text(f, board=True), columns*rows)
+
+def bench_draw_game(columns, rows):
+    import minesweeper_curses
+    game = minesweeper.Game(random_mines(columns, rows, 0.1))
+    game.reveal_all()
+    rect = minesweeper_curses.Rect(0, 1, columns*2+1, rows+2)
+    return (FakeScreen, lambda screen: minesweeper_curses.draw_game(screen, rect, game), columns*rows)
+
+BENCHMARKS = {
+    'table_getitem': bench_table_getitem,
+    'table_setitem': bench_table_setitem,
+    'table_neighbors': bench_table_neighbors,
+    'table_neighbor_indices': bench_table_neighbor_indices,
+    'table_iter': bench_table_iter,
+    'game_init': bench_game_init,
+    'game_init_python': bench_game_init_python,
+    'create_random': bench_create_random,
+    'reveal_cascade': bench_reveal_cascade,
+    'reveal_cascade_bitboard': bench_reveal_cascade_bitboard,
+    'reveal_single': bench_reveal_single,
+    'reveal_single_bitboard': bench_reveal_single_bitboard,
+    'status': bench_status,
+    'write_text': bench_write_text,
+    'draw_game': bench_draw_game,
+}
+
+def measure(setup, run, repeat=1):
+    """Returns the best time in seconds of repeat calls of run.
+    If setup is not None, it is called before each call and its result is passed to run.
+    """
+    best = None
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def run_benchmarks(names, sizes, repeat=3):
+    """Runs the benchmarks and returns the results as a dict that can be stored as JSON."""
+    results = {}
+    for name in names:
+        for columns, rows in sizes:
+            setup, run, ops = BENCHMARKS[name](columns, rows)
+            seconds = measure(setup, run, repeat)
+            results['{0}@{1}x{2}'.format(name, columns, rows)] = {
+                'seconds': seconds,
+                'ops': ops,
+                'seconds_per_op': seconds/ops,
+            }
+    return {
+        'python': platform.python_version(),
+        'numpy': minesweeper.numpy is not None,
+        'results': results,
+    }
+
+def compare(baseline, current, threshold):
+    """Returns a list of (key, baseline seconds, current seconds, ratio) and a list of the
+    keys that are slower than the baseline by more than threshold.
+    Benchmarks missing in either run are ignored.
+    """
+    rows = []
+    regressions = []
+    for key, result in current['results'].items():
+        if key not in baseline['results']:
+            continue
+        before = baseline['results'][key]['seconds']
+        after = result['seconds']
+        ratio = after/before if before > 0 else float('inf')
+        rows.append((key, before, after, ratio))
+        if ratio > 1 + threshold:
+            regressions.append(key)
+    return (rows, regressions)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+        help='benchmarks to run, any of {0} (default: all)'.format(', '.join(sorted(BENCHMARKS))))
+    parser.add_argument('--sizes', nargs='+', type=parse_size,
+        default=SIZES, help='board sizes as COLUMNSxROWS')
+    parser.add_argument('--large', action='store_true',
+        help='add the large sizes {0}'.format(' '.join('{0}x{1}'.format(*size) for size in LARGE_SIZES)))
+    parser.add_argument('--repeat', type=int, default=3, help='number of repetitions per measurement')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare against results stored with --output')
+    parser.add_argument('--threshold', type=float, default=0.2,
+        help='allowed slowdown against the baseline as a fraction (default: 0.2)')
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark {0!r}'.format(name))
+
+    sizes = args.sizes + LARGE_SIZES if args.large else args.sizes
+    current = run_benchmarks(args.benchmarks or sorted(BENCHMARKS), sizes, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, current, args.threshold)
+        print('{0:<32} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'baseline', 'current', 'ratio'))
+        for key, before, after, ratio in rows:
+            marker = ' !' if key in regressions else ''
+            print('{0:<32} {1:>12.6f} {2:>12.6f} {3:>8.2f}{4}'.format(key, before, after, ratio, marker))
+        if regressions:
+            print('{0} benchmarks regressed by more than {1:.0%}'.format(len(regressions), args.threshold))
+            return 1
+    elif not args.output:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,23 @@
 import curses
 import os
 from collections import namedtuple
+import random
+import time
 import minesweeper
+from chunked import ChunkedGame
+import instrumentation
+import journal
+from factory import BoardFactory
+from minesweeper_generate import BoardPool
+from probability import Probabilities
+
+# the moves of the running game are recorded here, so it can be resumed after a crash
+JOURNAL_PATH = os.path.expanduser('~/.minesweeper_journal')
+# prebuilt boards that need no guess, filled with minesweeper_generate
+POOL_DIRECTORY = os.path.expanduser('~/.minesweeper_pool')
+# if set, instrumentation is enabled from the start and the statistics are
+# appended to this file as a JSON line after every game
+STATS_PATH = os.environ.get('MINESWEEPER_STATS')
 
 class Rect:
     def __init__(self, x, y, width, height):
@@ -42,39 +58,85 @@ def draw_frame(stdscr, rect, thick_border=False):
         stdscr.addstr(rect.y+h, rect.x, line)
     return Rect(rect.x+1, rect.y+1, rect.width-2, rect.height-2)
 
-def draw_game(stdscr, rect, game):
-    """Draws the game fields."""
-    rect = Rect(rect.x, rect.y, game.column_count()*2+1, game.row_count()+2)
-    rect = draw_frame(stdscr, rect)
-
-    for i, (mine, flag, hint) in enumerate(zip(game.mines, game.flags, game.hints)):
-        x, y = game.mines.linear_to_subscript(i)
-        x = x*2 + rect.x # add padding between characters to get a nicer aspect ratio
-        y = y + rect.y
-        if flag == minesweeper.Flags.Unknown:
-            stdscr.addstr(y, x, "?")
-        elif flag == minesweeper.Flags.Marked:
-            stdscr.addstr(y, x, "\u26F3") # flag in hole
+def draw_field(stdscr, rect, game, x, y, offset=(0, 0), probabilities=None):
+    """Draws a single game field inside the game rect.
+    The offset is the field shown in the top left corner of the rect.
+    If probabilities are given as returned by Probabilities.mine_probabilities,
+    Unknown fields show their probability to be a mine in tenths.
+    """
+    flag = game.flags[x, y]
+    sx = (x - offset[0])*2 + rect.x # add padding between characters to get a nicer aspect ratio
+    sy = y - offset[1] + rect.y
+    if flag == minesweeper.Flags.Unknown:
+        p = None
+        if probabilities is not None:
+            p = probabilities[0].get((x, y), probabilities[1])
+        if p is None:
+            stdscr.addstr(sy, sx, "?")
         else:
-            if mine:
-                stdscr.addstr(y, x, "\u26ED") # gear without hub
+            stdscr.addstr(sy, sx, str(min(int(p*10), 9)), curses.A_BOLD)
+    elif flag == minesweeper.Flags.Marked:
+        stdscr.addstr(sy, sx, "\u26F3") # flag in hole
+    else:
+        if game.mines[x, y]:
+            stdscr.addstr(sy, sx, "\u26ED") # gear without hub
+        else:
+            hint = game.hints[x, y]
+            if hint == 0:
+                stdscr.addstr(sy, sx, " ")
             else:
-                if hint == 0:
-                    stdscr.addstr(y, x, " ")
-                else:
-                    stdscr.addstr(y, x, str(hint), curses.A_DIM)
+                stdscr.addstr(sy, sx, str(hint), curses.A_DIM)
+
+def draw_game(stdscr, rect, game, offset=(0, 0), size=None, probabilities=None):
+    """Draws the game fields.
+    If size is given, only the size[0] columns and size[1] rows starting
+    at the field offset are drawn.
+    """
+    if size is None:
+        size = (game.column_count(), game.row_count())
+    columns, rows = size
+    rect = Rect(rect.x, rect.y, columns*2+1, rows+2)
+    rect = draw_frame(stdscr, rect)
+
+    for y in range(offset[1], offset[1]+rows):
+        for x in range(offset[0], offset[0]+columns):
+            draw_field(stdscr, rect, game, x, y, offset, probabilities)
     return rect
 
-def draw_header(stdscr, game):
-    """Draws some info about in the first line."""
+def header_text(game):
+    """Returns the text shown in the header."""
     if game.is_solved():
-        text = "Congratulations, You Won!"
+        return "Congratulations, You Won!"
     elif game.is_lost():
-        text = "You Lost!"
+        return "You Lost!"
+    elif game.remaining_mines() is None:
+        return "Marked Mines: {0}".format(game.num_marked)
     else:
-        remaining = game.mines.count(True) - game.flags.count(minesweeper.Flags.Marked)
-        text = "Remaining Mines: {0}".format(remaining)
+        return "Remaining Mines: {0}".format(game.remaining_mines())
+
+def viewport_text(game, offset, size):
+    """Returns which part of the game is visible or an empty string if the whole game is visible."""
+    columns, rows = game.column_count(), game.row_count()
+    if size == (columns, rows):
+        return ""
+    if columns is None or rows is None:
+        return "Columns {0}..{1} Rows {2}..{3}".format(
+            offset[0], offset[0]+size[0]-1, offset[1], offset[1]+size[1]-1)
+    return "Columns {0}-{1}/{2} Rows {3}-{4}/{5}".format(
+        offset[0]+1, offset[0]+size[0], columns,
+        offset[1]+1, offset[1]+size[1], rows)
+
+def draw_header(stdscr, game, text=None, debug=None):
+    """Draws some info about in the first line.
+    A debug text is shown right aligned if there is space left.
+    """
+    if text is None:
+        text = header_text(game)
+    stdscr.move(0, 0)
+    stdscr.clrtoeol()
     stdscr.addstr(0, 0, text, curses.A_REVERSE)
+    if debug and len(text) + len(debug) + 2 < curses.COLS:
+        stdscr.addstr(0, curses.COLS-1-len(debug), debug, curses.A_DIM)
     return Rect(0, 0, curses.COLS-1, 1)
 
 def draw_footer(stdscr, game):
@@ -86,27 +148,132 @@ def draw_footer(stdscr, game):
             ("Navigate:", "\u2190 \u2192 \u2191 \u2193"),
             ("Reveal:", "Space \u2423"),
             ("Toggle Mark:", "Enter \u23CE"),
+            ("Probabilities:", "P"),
+            ("Undo/Redo:", "U R"),
+            ("Debug:", "D"),
             ("Menu:", "Escape"),
         ]
+    stdscr.move(curses.LINES-1, 0)
+    stdscr.clrtoeol()
     offset = 0
     for name, control in controls:
+        # the last column cannot be written, so controls that do not fit are left out
+        if offset + len(name) + len(control) + 2 >= curses.COLS:
+            break
         stdscr.addstr(curses.LINES-1, offset, name, curses.A_REVERSE)
         offset += len(name)
         stdscr.addstr(curses.LINES-1, offset, " " + control + " ")
         offset += len(control) + 2
     return Rect(0, curses.LINES-1, curses.COLS-1, 1)
 
-def draw_screen(stdscr, game):
+def draw_screen(stdscr, game, offset=(0, 0), size=None, header=None, probabilities=None, debug=None):
     """Draws the complete screen including header, game and footer."""
-    header_rect = draw_header(stdscr, game)
+    header_rect = draw_header(stdscr, game, header, debug)
     footer_rect = draw_footer(stdscr, game)
     game_rect = Rect(0, header_rect.height, curses.COLS-1, curses.LINES-1-header_rect.height-footer_rect.height)
-    game_rect = draw_game(stdscr, game_rect, game)
+    game_rect = draw_game(stdscr, game_rect, game, offset, size, probabilities)
     return game_rect
 
-def cursor_to_index(cursor_pos, game_rect):
-    """Converts the absolute cursor_pos to a game field index."""
-    return ((cursor_pos.x - game_rect.x)//2, cursor_pos.y - game_rect.y)
+class Renderer:
+    """Redraws only the parts of the screen that changed since the last frame.
+    The fields changed by the game have to be passed to invalidate.
+    The header and footer are redrawn when their content changes.
+    Games that are larger than the terminal are shown through a viewport
+    that follows the cursor, so only the visible fields are ever drawn.
+    """
+    def __init__(self, stdscr, game):
+        self.stdscr = stdscr
+        self.game = game
+        self.game_rect = None
+        # the field in the top left corner of the viewport
+        self.offset = (0, 0)
+        # mine probabilities shown on top of Unknown fields
+        self.probabilities = None
+        self.dirty = set()
+        self.full_redraw = True
+        self.header = None
+        self.footer = None
+        # number of fields drawn in the last frame
+        self.cells_drawn = 0
+
+    def viewport_size(self):
+        """Returns the number of columns and rows that fit on the screen."""
+        # 1 for header, 1 for footer, 2 for frame
+        rows = max(curses.LINES-4, 1)
+        # the last column is not used, 2 for frame and 1 padding between fields
+        columns = max((curses.COLS-2)//2, 1)
+        # unbounded games always fill the screen
+        if self.game.row_count() is not None:
+            rows = min(rows, self.game.row_count())
+        if self.game.column_count() is not None:
+            columns = min(columns, self.game.column_count())
+        return (columns, rows)
+
+    def scroll_to(self, x, y):
+        """Moves the viewport as little as possible to make the field visible."""
+        columns, rows = self.viewport_size()
+        offset = (
+            clamp(self.offset[0], x-columns+1, x),
+            clamp(self.offset[1], y-rows+1, y)
+        )
+        if self.game.column_count() is not None:
+            offset = (clamp(offset[0], 0, self.game.column_count()-columns), offset[1])
+        if self.game.row_count() is not None:
+            offset = (offset[0], clamp(offset[1], 0, self.game.row_count()-rows))
+        if offset != self.offset:
+            self.offset = offset
+            self.full_redraw = True
+
+    def screen_position(self, x, y):
+        """Returns the screen coordinates of a visible field."""
+        return ((x - self.offset[0])*2 + self.game_rect.x, y - self.offset[1] + self.game_rect.y)
+
+    def invalidate(self, fields=None):
+        """Marks fields for redrawing or the whole screen if fields is None."""
+        if fields is None:
+            self.full_redraw = True
+        else:
+            self.dirty.update(fields)
+
+    def draw(self):
+        """Draws the next frame into the virtual screen and returns the game rect.
+        The caller has to call curses.doupdate to show the frame.
+        """
+        stats = instrumentation.active
+        if stats is not None:
+            start = time.perf_counter()
+        game = self.game
+        size = self.viewport_size()
+        header = header_text(game)
+        view = viewport_text(game, self.offset, size)
+        if view:
+            header += "  " + view
+        # the statistics of the previous frame
+        debug = stats.text() if stats is not None else None
+        footer = game.is_lost() or game.is_solved()
+        if self.full_redraw:
+            self.stdscr.erase()
+            self.game_rect = draw_screen(self.stdscr, game, self.offset, size, header, self.probabilities, debug)
+            self.cells_drawn = size[0]*size[1]
+        else:
+            if (header, debug) != self.header:
+                draw_header(self.stdscr, game, header, debug)
+            if footer != self.footer:
+                draw_footer(self.stdscr, game)
+            ox, oy = self.offset
+            self.cells_drawn = 0
+            for x, y in self.dirty:
+                if ox <= x < ox+size[0] and oy <= y < oy+size[1]:
+                    draw_field(self.stdscr, self.game_rect, game, x, y, self.offset, self.probabilities)
+                    self.cells_drawn += 1
+        self.header = (header, debug)
+        self.footer = footer
+        self.dirty.clear()
+        self.full_redraw = False
+        self.stdscr.noutrefresh()
+        if stats is not None:
+            stats.add_frame(time.perf_counter() - start, self.cells_drawn)
+        return self.game_rect
 
 def open_menu(stdscr, items):
     """Opens a menu containing items and returns the selected item.
@@ -138,83 +305,262 @@ def open_menu(stdscr, items):
     curses.curs_set(True)
     return items[selected]
 
+# columns, rows and number of mines of each difficulty in the order of the menu
+# boards of difficulties with at most this many fields are generated before they are chosen
+PREFETCH_FIELDS = 10000
+
+DIFFICULTIES = {
+    "Easy": (10, 10, 10), # 10% of all fields are mines
+    "Medium": (15, 15, 22),
+    "Hard": (20, 20, 40),
+    "Huge": (1000, 1000, 100000),
+    "Endless": (None, None, 0.15),
+}
+
 def open_difficulty_menu(stdscr):
     """Opens a menu for the user to select a difficulty level.
     Returns a tuple with the columns and rows for the game with the
     chosen difficulty and the number of mines.
+    For the unbounded Endless game, columns and rows are None and the
+    number of mines is replaced by the fraction of fields that are mines.
     """
-    difficulty = open_menu(stdscr, items=("Easy", "Medium", "Hard"))
-    if difficulty == "Easy":
-        columns = 10
-        rows = 10
-        num_mines = int(columns*rows*0.1) # 10% of all fields are mines
-    elif difficulty == "Hard":
-        columns = 20
-        rows = 20
-        num_mines = int(columns*rows*0.1)
-    else:
-        columns = 15
-        rows = 15
-        num_mines = int(columns*rows*0.1)
-    return (columns, rows, num_mines)
+    difficulty = open_menu(stdscr, items=tuple(DIFFICULTIES))
+    return DIFFICULTIES[difficulty]
+
+def board_factory():
+    """Returns the factory that generates boards in the background.
+    The small difficulties are generated from the start, larger boards only
+    after they were chosen once.
+    """
+    global _factory
+    if _factory is None:
+        _factory = BoardFactory()
+        for columns, rows, num_mines in DIFFICULTIES.values():
+            if columns is not None and columns*rows <= PREFETCH_FIELDS:
+                _factory.prefetch(columns, rows, num_mines)
+    return _factory
+
+_factory = None
+
+def start_journal(game):
+    """Starts recording the moves of a game. Returns None if the journal cannot be written."""
+    try:
+        return journal.Journal.create(JOURNAL_PATH, game)
+    except OSError:
+        return None
+
+def resume_journal():
+    """Returns the journal of a game that was not finished or None.
+    A journal that cannot be read is removed.
+    """
+    try:
+        return journal.Journal.resume(JOURNAL_PATH)
+    except (OSError, ValueError):
+        try:
+            os.remove(JOURNAL_PATH)
+        except OSError:
+            pass
+        return None
+
+def end_journal(recording):
+    """Stops recording and removes the journal."""
+    if recording is None:
+        return
+    recording.close()
+    try:
+        os.remove(JOURNAL_PATH)
+    except OSError:
+        pass
+
+def take_pool_board(columns, rows, num_mines):
+    """Returns a board from the pool of boards that need no guess or None."""
+    try:
+        return BoardPool(POOL_DIRECTORY).take(columns, rows, num_mines)
+    except (OSError, ValueError):
+        return None
+
+def enable_stats():
+    """Starts timing the game methods. The statistics are shown in the header."""
+    return instrumentation.enable(classes=(minesweeper.Game, ChunkedGame))
+
+def dump_stats():
+    """Appends the statistics to STATS_PATH if it is set and instrumentation is enabled."""
+    if STATS_PATH and instrumentation.active is not None:
+        try:
+            with open(STATS_PATH, 'a') as f:
+                instrumentation.active.dump(f, factory=board_factory().summary())
+        except OSError:
+            pass
 
 def main(stdscr):
+    # start generating boards while the menu is shown
+    board_factory()
     while True:
-        selected = open_menu(stdscr, items=("New Game", "Exit"))
+        items = ("New Game", "Exit")
+        if os.path.exists(JOURNAL_PATH):
+            items = ("Resume",) + items
+        selected = open_menu(stdscr, items=items)
         if selected == "Exit":
             return
+        if selected == "Resume":
+            recording = resume_journal()
+            if recording is None:
+                continue
+            game = recording.game
+            game_loop(stdscr, game.column_count(), game.row_count(), game.num_mines, recording)
+            continue
         if selected == "New Game":
             columns, rows, num_mines = open_difficulty_menu(stdscr)
 
-        columns = clamp(columns, 0, curses.COLS-3) # 2 for frame
-        rows = clamp(rows, 0, curses.LINES-5) # 2 for frame, 2 for header+footer
-
         game_loop(stdscr, columns, rows, num_mines)
 
-def game_loop(stdscr, columns, rows, num_mines):
-    game = minesweeper.Game.create_random(columns, rows, num_mines)
+def game_loop(stdscr, columns, rows, num_mines, recording=None):
+    """Runs a game until it is over or the player leaves.
+    If recording is a Journal, its game is continued.
+    """
+    # the mines of bounded games are moved away from the first revealed field,
+    # so that the first field is never a mine
+    started = columns is None or rows is None or recording is not None
+    if recording is not None:
+        game = recording.game
+    elif started:
+        game = ChunkedGame(seed=random.getrandbits(64), density=num_mines)
+    else:
+        # boards from the pool need no guess and are opened already
+        game = take_pool_board(columns, rows, num_mines)
+        if game is not None:
+            started = True
+            recording = start_journal(game)
+        else:
+            game = board_factory().take(columns, rows, num_mines)
+    renderer = Renderer(stdscr, game)
+    if STATS_PATH and instrumentation.active is None:
+        enable_stats()
+
+    Point = namedtuple('Point', ['x', 'y'])
+    # the cursor is the selected game field
+    cursor = Point(0, 0)
+    # computes the probabilities while they are shown
+    overlay = None
+    # snapshots before the moves that can be undone and redone
+    undo = []
+    redo = []
 
-    Point = namedtuple('Point', ['x', 'y'], verbose=True)
-    cursor_pos = Point(0, 0)
+    def show_probabilities():
+        try:
+            renderer.probabilities = overlay.mine_probabilities()
+        except ValueError:
+            # wrong marks contradict the hints
+            renderer.probabilities = None
+        renderer.invalidate()
 
     while True:
-        stdscr.clear()
-        game_rect = draw_screen(stdscr, game)
-
         # restrict cursor to the game field
-        cursor_pos = Point(
-            clamp(cursor_pos.x, game_rect.x, game_rect.x+game_rect.width-1),
-            clamp(cursor_pos.y, game_rect.y, game_rect.y+game_rect.height-1)
-        )
-        stdscr.move(cursor_pos.y, cursor_pos.x)
-        stdscr.refresh()
+        if game.column_count() is not None:
+            cursor = Point(clamp(cursor.x, 0, game.column_count()-1), cursor.y)
+        if game.row_count() is not None:
+            cursor = Point(cursor.x, clamp(cursor.y, 0, game.row_count()-1))
+        renderer.scroll_to(*cursor)
+        renderer.draw()
+        x, y = renderer.screen_position(*cursor)
+        stdscr.move(y, x)
+        stdscr.noutrefresh()
+        curses.doupdate()
 
         c = stdscr.getch()
+        moved = False
+        page = renderer.viewport_size()[1]
         if c == curses.KEY_LEFT:
-            cursor_pos = Point(cursor_pos.x-2, cursor_pos.y)
+            cursor = Point(cursor.x-1, cursor.y)
         if c == curses.KEY_RIGHT:
-            cursor_pos = Point(cursor_pos.x+2, cursor_pos.y)
+            cursor = Point(cursor.x+1, cursor.y)
         if c == curses.KEY_UP:
-            cursor_pos = Point(cursor_pos.x, cursor_pos.y-1)
+            cursor = Point(cursor.x, cursor.y-1)
         if c == curses.KEY_DOWN:
-            cursor_pos = Point(cursor_pos.x, cursor_pos.y+1)
-        if c == curses.KEY_ENTER or c == 10:
-            game.toggle_mark(*cursor_to_index(cursor_pos, game_rect))
+            cursor = Point(cursor.x, cursor.y+1)
+        if c == curses.KEY_PPAGE:
+            cursor = Point(cursor.x, cursor.y-page)
+        if c == curses.KEY_NPAGE:
+            cursor = Point(cursor.x, cursor.y+page)
+        if (c == curses.KEY_ENTER or c == 10) and started:
+            snapshot = game.snapshot()
+            game.toggle_mark(*cursor)
+            renderer.invalidate(game.changed)
+            moved = True
         if c == " " or c == 32:
-            game.reveal(*cursor_to_index(cursor_pos, game_rect))
+            if not started:
+                try:
+                    game.move_mines_away(*cursor)
+                except ValueError:
+                    # too many mines to keep the first field free
+                    game = minesweeper.Game.create_random(columns, rows, num_mines, safe=cursor)
+                recording = start_journal(game)
+                renderer.game = game
+                renderer.invalidate()
+                started = True
+            snapshot = game.snapshot()
+            game.reveal(*cursor)
+            renderer.invalidate(game.changed)
+            moved = True
+        if moved and game.changed:
+            undo.append(snapshot)
+            redo.clear()
+        if (c == ord('u') or c == ord('U')) and undo:
+            redo.append(game.snapshot())
+            game.restore(undo.pop())
+            renderer.invalidate(game.changed)
+            moved = True
+        if (c == ord('r') or c == ord('R')) and redo:
+            undo.append(game.snapshot())
+            game.restore(redo.pop())
+            renderer.invalidate(game.changed)
+            moved = True
+        if c == ord('p') or c == ord('P'):
+            if overlay is None and started and game.remaining_mines() is not None:
+                overlay = Probabilities(game)
+                show_probabilities()
+            else:
+                overlay = None
+                renderer.probabilities = None
+                renderer.invalidate()
+        elif moved and overlay is not None:
+            overlay.update(game.changed)
+            show_probabilities()
+        if c == ord('d') or c == ord('D'):
+            if instrumentation.active is None:
+                enable_stats()
+            else:
+                instrumentation.disable()
+            renderer.invalidate()
+        if c == curses.KEY_RESIZE:
+            # the viewport and the footer are computed from LINES and COLS
+            curses.update_lines_cols()
+            renderer.invalidate()
         if c == 27: # Escape
             selected = open_menu(stdscr, ["Continue", "New Game", "Exit"])
             if selected == "Exit":
+                # the journal is kept, so the game can be resumed
+                if recording is not None:
+                    recording.close()
                 return
             elif selected == "New Game":
+                end_journal(recording)
                 columns, rows, num_mines = open_difficulty_menu(stdscr)
                 return game_loop(stdscr, columns, rows, num_mines)
+            # the menu was drawn over the game
+            renderer.invalidate()
 
         if game.is_lost() or game.is_solved():
+            end_journal(recording)
+            dump_stats()
             # reveal the complete solution
             game.reveal_all()
-            stdscr.clear()
-            draw_screen(stdscr, game)
+            renderer.invalidate(game.changed)
+            if renderer.probabilities is not None:
+                renderer.probabilities = None
+                renderer.invalidate()
+            renderer.draw()
+            curses.doupdate()
 
             # wait for user to press any key
             curses.curs_set(False)
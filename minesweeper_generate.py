@@ -0,0 +1,151 @@
+"""Generates boards that can be solved without guessing and keeps them in a pool on disk
+
+A board is accepted if the solver can solve it completely after the
+opening field in the center was revealed. Since most random boards need a
+guess, candidates are checked in a process pool, which is stopped as soon
+as enough boards were found.
+
+Example:
+    python -m minesweeper_generate --size 30x16 --mines 99 --count 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from minesweeper import Game
+from solver import Solver
+import savefile
+from minesweeper_sim import parse_size
+
+def opening(columns, rows):
+    """Returns the field that is revealed first on generated boards."""
+    return (columns//2, rows//2)
+
+def is_no_guess(game, first):
+    """Returns True if the solver solves the game after revealing the first field.
+    The game is played in the process.
+    """
+    solver = Solver(game)
+    if not game.reveal(*first):
+        return False
+    solver.update(game.changed)
+    solver.solve()
+    return game.is_solved() and not game.is_lost()
+
+def search(task):
+    """Checks a number of candidate boards and returns the number of
+    candidates and the seeds of the boards that need no guess.
+    The candidate seeds only depend on the seed and the task index.
+    """
+    columns, rows, num_mines, seed, index, attempts = task
+    rng = random.Random('{0}:{1}'.format(seed, index))
+    first = opening(columns, rows)
+    found = []
+    for _ in range(attempts):
+        board_seed = rng.getrandbits(64)
+        game = Game.create_random(columns, rows, num_mines, seed=board_seed, safe=first)
+        if is_no_guess(game, first):
+            found.append(board_seed)
+    return (attempts, found)
+
+def generate(columns, rows, num_mines, count, workers=None, seed=0, attempts_per_task=20, max_attempts=1000000):
+    """Returns the seeds of count boards that need no guess and the number of checked candidates.
+    A board is recreated with Game.create_random(columns, rows, num_mines,
+    seed=board_seed, safe=opening(columns, rows)).
+    The candidates are checked in a process pool that is terminated as soon
+    as enough boards were found. If workers is 1, they are checked in the
+    current process. Raises a ValueError if max_attempts candidates do not
+    contain enough boards.
+    """
+    tasks = [(columns, rows, num_mines, seed, index, attempts_per_task)
+        for index in range(max(max_attempts//attempts_per_task, 1))]
+    seeds = []
+    attempts = 0
+    pool = None if workers == 1 else multiprocessing.Pool(workers)
+    try:
+        results = map(search, tasks) if pool is None else pool.imap_unordered(search, tasks)
+        for checked, found in results:
+            attempts += checked
+            seeds.extend(found)
+            if len(seeds) >= count:
+                return (seeds[:count], attempts)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    raise ValueError('Found only {0} of {1} boards in {2} candidates'.format(len(seeds), count, attempts))
+
+class BoardPool:
+    """Directory of prebuilt boards that need no guess.
+    Every board is a savefile named after its size, number of mines and
+    seed, stored with the opening already revealed, so taking a board only
+    reads a small file.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, columns, rows, num_mines, seed):
+        return os.path.join(self.directory, '{0}x{1}_{2}_{3}.msw'.format(columns, rows, num_mines, seed))
+
+    def seeds(self, columns, rows, num_mines):
+        """Returns the sorted seeds of all boards of a kind in the pool."""
+        prefix = '{0}x{1}_{2}_'.format(columns, rows, num_mines)
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(int(name[len(prefix):-4]) for name in names
+            if name.startswith(prefix) and name.endswith('.msw'))
+
+    def add(self, columns, rows, num_mines, seed):
+        """Creates the board of a seed, reveals its opening and stores it."""
+        game = Game.create_random(columns, rows, num_mines, seed=seed, safe=opening(columns, rows))
+        game.reveal(*opening(columns, rows))
+        os.makedirs(self.directory, exist_ok=True)
+        game.save(self.path(columns, rows, num_mines, seed))
+
+    def take(self, columns, rows, num_mines, cls=Game):
+        """Removes a board from the pool and returns it or None if there is no board of this kind."""
+        for seed in self.seeds(columns, rows, num_mines):
+            path = self.path(columns, rows, num_mines, seed)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.remove(path)
+            except OSError:
+                continue # taken by another process
+            return savefile.loads(data, cls)
+        return None
+
+    def fill(self, columns, rows, num_mines, count, workers=None, seed=None):
+        """Generates boards until the pool holds count boards of a kind.
+        Returns the number of added boards.
+        """
+        missing = count - len(self.seeds(columns, rows, num_mines))
+        if missing <= 0:
+            return 0
+        if seed is None:
+            seed = random.getrandbits(64)
+        seeds, _ = generate(columns, rows, num_mines, missing, workers, seed)
+        for board_seed in seeds:
+            self.add(columns, rows, num_mines, board_seed)
+        return len(seeds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=parse_size, default=(30, 16), help='board size as COLUMNSxROWS')
+    parser.add_argument('--mines', type=int, default=99, help='number of mines')
+    parser.add_argument('--count', type=int, default=10, help='number of boards the pool should hold')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes')
+    parser.add_argument('--seed', type=int, help='seed of the candidates (default: random)')
+    parser.add_argument('--pool', default=os.path.expanduser('~/.minesweeper_pool'), help='directory of the pool')
+    args = parser.parse_args()
+
+    columns, rows = args.size
+    start = time.perf_counter()
+    added = BoardPool(args.pool).fill(columns, rows, args.mines, args.count, args.workers, args.seed)
+    print('Added {0} boards in {1:.1f}s'.format(added, time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()
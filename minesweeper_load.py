@@ -0,0 +1,151 @@
+"""Generates load on a minesweeper server and reports its throughput and latency
+
+Every session opens a connection, starts a game and reveals random Unknown
+fields until the game is over, then starts the next game. The latency of a
+request is the time from sending it until the response is read. The moves
+and the requests that start a game are reported separately, so the moves
+per second and the latencies of the moves are not mixed with new games.
+
+Example:
+    python -m minesweeper_server --port 8765 &
+    python -m minesweeper_load --port 8765 --sessions 1000 --moves 100000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from minesweeper_sim import parse_size
+
+def percentile(values, fraction):
+    """Returns the value below which the given fraction of the sorted values lie.
+    >>> percentile([1, 2, 3, 4], 0.5)
+    2
+    >>> percentile(list(range(1, 101)), 0.99)
+    99
+    """
+    if not values:
+        return None
+    index = max(int(round(fraction*len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+class Client:
+    """A connection to a server that keeps its own view of the board up to date with the changed fields."""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.board = None
+        # lists of the latencies by operation
+        self.latencies = {}
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=2**28)
+        return cls(reader, writer)
+
+    async def request(self, **request):
+        """Sends a request and returns the response."""
+        start = time.perf_counter()
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+        line = await self.reader.readline()
+        self.latencies.setdefault(request['op'], []).append(time.perf_counter() - start)
+        if not line:
+            raise ConnectionError('Server closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response
+
+    async def new(self, columns, rows, num_mines, safe=None, seed=None):
+        response = await self.request(op='new', columns=columns, rows=rows, mines=num_mines, safe=safe, seed=seed)
+        self.board = [['?']*columns for _ in range(rows)]
+        return response
+
+    async def move(self, op, x, y):
+        """Makes a move and applies the changed fields to the board."""
+        response = await self.request(op=op, x=x, y=y)
+        for cx, cy, value in response['changed']:
+            self.board[cy][cx] = value
+        return response
+
+    def unknown_fields(self):
+        return [(x, y) for y, row in enumerate(self.board) for x, value in enumerate(row) if value == '?']
+
+    def close(self):
+        self.writer.close()
+
+async def play_session(host, port, columns, rows, num_mines, num_moves, rng):
+    """Plays random games until num_moves moves were made.
+    Returns the latencies of the requests by operation and the number of finished games.
+    """
+    client = await Client.connect(host, port)
+    games = 0
+    try:
+        moves = 0
+        while moves < num_moves:
+            first = (columns//2, rows//2)
+            await client.new(columns, rows, num_mines, safe=first, seed=rng.getrandbits(32))
+            response = await client.move('reveal', *first)
+            moves += 1
+            while response['status'] == 'playing' and moves < num_moves:
+                response = await client.move('reveal', *rng.choice(client.unknown_fields()))
+                moves += 1
+            games += 1
+    finally:
+        client.close()
+    return (client.latencies, games)
+
+async def run_load(host, port, sessions, moves, columns=30, rows=16, num_mines=99, seed=0):
+    """Runs concurrent sessions that make moves moves in total and returns a dict of the results."""
+    rng = random.Random(seed)
+    per_session = [moves//sessions + (1 if i < moves % sessions else 0) for i in range(sessions)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        play_session(host, port, columns, rows, num_mines, n, random.Random(rng.getrandbits(64)))
+        for n in per_session if n > 0))
+    elapsed = time.perf_counter() - start
+
+    def collect(operations):
+        return sorted(latency for session_latencies, _ in results
+            for op in operations for latency in session_latencies.get(op, ()))
+    move_latencies = collect(('reveal', 'mark'))
+    new_latencies = collect(('new',))
+    return {
+        'sessions': sessions,
+        'requests': len(move_latencies) + len(new_latencies),
+        'moves': len(move_latencies),
+        'games': sum(games for _, games in results),
+        'seconds': elapsed,
+        'moves_per_second': len(move_latencies)/elapsed,
+        'latency_p50': percentile(move_latencies, 0.5),
+        'latency_p99': percentile(move_latencies, 0.99),
+        'latency_max': move_latencies[-1] if move_latencies else None,
+        'new_latency_p50': percentile(new_latencies, 0.5),
+        'new_latency_p99': percentile(new_latencies, 0.99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='address of the server')
+    parser.add_argument('--port', type=int, default=8765, help='port of the server')
+    parser.add_argument('--sessions', type=int, default=100, help='number of concurrent connections')
+    parser.add_argument('--moves', type=int, default=10000, help='total number of moves')
+    parser.add_argument('--size', type=parse_size, default=(30, 16), help='board size as COLUMNSxROWS')
+    parser.add_argument('--mines', type=int, default=99, help='number of mines')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random moves')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    columns, rows = args.size
+    results = asyncio.run(run_load(args.host, args.port, args.sessions, args.moves,
+        columns, rows, args.mines, args.seed))
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print('{0:>20}: {1}'.format(name, value))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Hosts minesweeper games for many clients over TCP
+
+Every connection is a session that plays one game at a time. Requests and
+responses are JSON objects, one per line:
+
+    {"op": "new", "columns": 30, "rows": 16, "mines": 99, "safe": [15, 8]}
+    {"op": "reveal", "x": 15, "y": 8}
+    {"op": "mark", "x": 0, "y": 0}
+    {"op": "state"}
+
+Moves are answered with the fields they changed as [x, y, cell], where cell
+is '?' for Unknown, '!' for Marked, '*' for a revealed mine or the hint of
+a revealed field, so a client never has to receive the whole board again.
+Errors are answered with {"error": message}.
+
+Example:
+    python -m minesweeper_server --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import minesweeper
+from minesweeper import Flags
+
+# games with more fields are created and played in the executor, so large
+# boards and huge cascades do not block the other sessions
+OFFLOAD_FIELDS = 100000
+# the largest board a client can request by default
+MAX_FIELDS = 10000000
+# the longest request line in bytes
+LINE_LIMIT = 2**20
+
+def cell(game, x, y):
+    """Returns the character a player sees on a field.
+    >>> game = minesweeper.Game(minesweeper.Table.from_nested_list([[False, True, False]]))
+    >>> game.reveal(0, 0)
+    True
+    >>> cell(game, 0, 0), cell(game, 1, 0)
+    ('1', '?')
+    """
+    flag = game.flags[x, y]
+    if flag == Flags.Unknown:
+        return '?'
+    if flag == Flags.Marked:
+        return '!'
+    if game.mines[x, y]:
+        return '*'
+    return str(game.hints[x, y])
+
+def status(game):
+    """Returns 'won', 'lost' or 'playing'."""
+    if game.is_lost():
+        return 'lost'
+    if game.is_solved():
+        return 'won'
+    return 'playing'
+
+class Session:
+    """The game of a single connection.
+    The operations take the decoded request and return the response.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.game = None
+
+    def _move_response(self):
+        game = self.game
+        return {
+            'changed': [[x, y, cell(game, x, y)] for x, y in game.changed],
+            'status': status(game),
+            'remaining': game.remaining_mines(),
+        }
+
+    def _field(self, request):
+        if self.game is None:
+            raise ValueError('No game started')
+        x, y = int(request['x']), int(request['y'])
+        if not (0 <= x < self.game.column_count() and 0 <= y < self.game.row_count()):
+            raise ValueError('Field ({0}, {1}) is outside of the game'.format(x, y))
+        return (x, y)
+
+    def new(self, request):
+        columns, rows, num_mines = int(request['columns']), int(request['rows']), int(request['mines'])
+        if columns <= 0 or rows <= 0 or columns*rows > self.server.max_fields:
+            raise ValueError('Invalid game size {0}x{1}'.format(columns, rows))
+        safe = request.get('safe')
+        if safe is not None:
+            safe = (int(safe[0]), int(safe[1]))
+        self.game = minesweeper.Game.create_random(columns, rows, num_mines, request.get('seed'), safe)
+        return {'columns': columns, 'rows': rows, 'mines': num_mines, 'status': 'playing'}
+
+    def reveal(self, request):
+        x, y = self._field(request)
+        self.game.reveal(x, y, bool(request.get('known', True)))
+        return self._move_response()
+
+    def mark(self, request):
+        x, y = self._field(request)
+        self.game.toggle_mark(x, y)
+        return self._move_response()
+
+    def state(self, request):
+        game = self.game
+        if game is None:
+            raise ValueError('No game started')
+        return {
+            'board': [''.join(cell(game, x, y) for x in range(game.column_count())) for y in range(game.row_count())],
+            'status': status(game),
+            'remaining': game.remaining_mines(),
+        }
+
+    OPERATIONS = {
+        'new': new,
+        'reveal': reveal,
+        'mark': mark,
+        'state': state,
+    }
+
+    def size(self, request):
+        """Returns the number of fields of the game a request works on."""
+        if request.get('op') == 'new':
+            try:
+                return int(request['columns'])*int(request['rows'])
+            except (KeyError, TypeError, ValueError, OverflowError):
+                return 0
+        if self.game is None:
+            return 0
+        return self.game.column_count()*self.game.row_count()
+
+    def execute(self, operation, request):
+        """Runs an operation and returns the encoded response line."""
+        try:
+            response = operation(self, request)
+        except (ValueError, KeyError, TypeError, IndexError, OverflowError) as e:
+            response = {'error': str(e)}
+        return json.dumps(response, separators=(',', ':')).encode() + b'\n'
+
+    async def handle(self, line):
+        """Returns the encoded response to a single request line.
+        Requests on large games run in the executor including the encoding
+        of the response, so they do not block the other sessions.
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        operation = None
+        if isinstance(request, dict) and isinstance(request.get('op'), str):
+            operation = self.OPERATIONS.get(request['op'])
+        if operation is None:
+            return self.execute(unknown_operation, request)
+        if self.size(request) > OFFLOAD_FIELDS:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.server.executor, self.execute, operation, request)
+        return self.execute(operation, request)
+
+def unknown_operation(session, request):
+    raise ValueError('Invalid request {0!r}'.format(request))
+
+def line_too_long(session, request):
+    raise ValueError('Request is longer than {0} bytes'.format(LINE_LIMIT))
+
+class Server:
+    """Accepts connections and plays a Session for each of them."""
+    def __init__(self, executor=None, max_fields=MAX_FIELDS):
+        # None uses the default executor of the event loop
+        self.executor = executor
+        # the largest board a client can request
+        self.max_fields = max_fields
+        self.sessions = 0
+        self.requests = 0
+        # set while no connection is open
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    async def handle_connection(self, reader, writer):
+        session = Session(self)
+        self.sessions += 1
+        self.idle.clear()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # the line is longer than the limit of the stream, which
+                    # cannot find the start of the next request afterwards
+                    writer.write(session.execute(line_too_long, None))
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                writer.write(await session.handle(line))
+                self.requests += 1
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            if not self.sessions:
+                self.idle.set()
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Starts listening and returns the asyncio server.
+        With port 0, a free port is chosen, which can be read from the sockets of the returned server.
+        """
+        return await asyncio.start_server(self.handle_connection, host, port, limit=LINE_LIMIT)
+
+async def serve(host, port, max_fields=MAX_FIELDS):
+    server = await Server(max_fields=max_fields).start(host, port)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    parser.add_argument('--max-fields', type=int, default=MAX_FIELDS,
+        help='largest number of fields of a board (default: {0})'.format(MAX_FIELDS))
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_fields))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
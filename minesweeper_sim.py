@@ -0,0 +1,241 @@
+"""Plays many minesweeper games without user interface to measure strategies
+
+Example:
+    python -m minesweeper_sim --size 30x16 --mines 99 --games 10000 --strategy solver
+"""
+
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+import minesweeper
+from minesweeper import Flags
+from probability import Probabilities
+from solver import Solver
+
+class RecordedGame(minesweeper.Game):
+    """Game that counts the moves and the number of fields changed by each reveal.
+    The fields changed by all moves are collected in history until a strategy clears it.
+    """
+    def __init__(self, mines, flags=None):
+        super().__init__(mines, flags)
+        self.moves = 0
+        self.cascades = []
+        self.history = []
+
+    def reveal(self, x, y, reveal_known=True):
+        ok = super().reveal(x, y, reveal_known)
+        self.moves += 1
+        if self.changed:
+            self.cascades.append(len(self.changed))
+        self.history.extend(self.changed)
+        return ok
+
+    def toggle_mark(self, x, y):
+        super().toggle_mark(x, y)
+        self.moves += 1
+        self.history.extend(self.changed)
+
+def unknown_fields(game):
+    """Returns a list of all Unknown fields."""
+    return [game.flags.linear_to_subscript(i) for i, f in enumerate(game.flags) if f == Flags.Unknown]
+
+def play_random(game, rng):
+    """Reveals random Unknown fields until the game is over."""
+    fields = unknown_fields(game)
+    rng.shuffle(fields)
+    for x, y in fields:
+        if game.is_lost() or game.is_solved():
+            break
+        if game.flags[x, y] == Flags.Unknown:
+            game.reveal(x, y)
+
+def play_solver(game, rng):
+    """Makes all moves the solver can deduce and reveals a random Unknown field when it is stuck."""
+    solver = Solver(game)
+    while not game.is_lost() and not game.is_solved():
+        if solver.solve() == 0:
+            x, y = rng.choice(unknown_fields(game))
+            game.reveal(x, y)
+            solver.update(game.changed)
+
+def play_probability(game, rng):
+    """Like play_solver but reveals the field that is least likely a mine when the solver is stuck."""
+    solver = Solver(game)
+    probabilities = Probabilities(game)
+    game.history.clear()
+    while not game.is_lost() and not game.is_solved():
+        if solver.solve() == 0:
+            probabilities.update(game.history)
+            game.history.clear()
+            frontier, interior = probabilities.mine_probabilities()
+            best = min(frontier.values(), default=1.0)
+            if interior is not None and interior < best:
+                candidates = [f for f in unknown_fields(game) if f not in frontier]
+            else:
+                candidates = sorted(f for f, p in frontier.items() if p == best)
+            x, y = rng.choice(candidates)
+            game.reveal(x, y)
+            solver.update(game.changed)
+
+STRATEGIES = {
+    'random': play_random,
+    'solver': play_solver,
+    'probability': play_probability,
+}
+
+def load_strategy(name):
+    """Returns a strategy by name or from a 'module:function' specification.
+    A strategy is a function that takes a RecordedGame and a random.Random
+    instance and makes moves until the game is over or it gives up.
+    """
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module, _, function = name.partition(':')
+    if not function:
+        raise ValueError('Unknown strategy {0!r}'.format(name))
+    return getattr(importlib.import_module(module), function)
+
+class Statistics:
+    """Aggregated results of a number of games that can be merged."""
+    def __init__(self):
+        self.games = 0
+        self.won = 0
+        self.lost = 0
+        self.moves = 0
+        self.moves_squared = 0
+        self.cascades = 0
+        self.cascade_fields = 0
+        self.max_cascade = 0
+        self.seconds = 0.0
+
+    def add(self, game):
+        """Adds the result of a finished RecordedGame."""
+        self.games += 1
+        if game.is_lost():
+            self.lost += 1
+        elif game.is_solved():
+            self.won += 1
+        self.moves += game.moves
+        self.moves_squared += game.moves*game.moves
+        self.cascades += len(game.cascades)
+        self.cascade_fields += sum(game.cascades)
+        self.max_cascade = max([self.max_cascade] + game.cascades)
+
+    def merge(self, other):
+        """Adds the results of other to these results."""
+        for name in ('games', 'won', 'lost', 'moves', 'moves_squared', 'cascades', 'cascade_fields', 'seconds'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.max_cascade = max(self.max_cascade, other.max_cascade)
+
+    def summary(self):
+        """Returns a dict of the derived statistics."""
+        games = max(self.games, 1)
+        mean = self.moves/games
+        return {
+            'games': self.games,
+            'won': self.won,
+            'lost': self.lost,
+            'win_rate': self.won/games,
+            'moves_per_game': mean,
+            'moves_per_game_stddev': math.sqrt(max(self.moves_squared/games - mean*mean, 0.0)),
+            'mean_cascade': self.cascade_fields/max(self.cascades, 1),
+            'max_cascade': self.max_cascade,
+            'cpu_seconds': self.seconds,
+        }
+
+def play_chunk(task):
+    """Plays a chunk of games and returns their Statistics.
+    The random generator of a chunk only depends on the seed and the chunk
+    index, so the results do not depend on the number of workers or on the
+    order in which the chunks are played.
+    """
+    seed, index, num_games, columns, rows, num_mines, strategy_name = task
+    strategy = load_strategy(strategy_name)
+    rng = random.Random('{0}:{1}'.format(seed, index))
+    stats = Statistics()
+    start = time.perf_counter()
+    for _ in range(num_games):
+        # the first field is in the center and never a mine
+        first = (columns//2, rows//2)
+        game = RecordedGame.create_random(columns, rows, num_mines, seed=rng.getrandbits(64), safe=first)
+        game.reveal(*first)
+        strategy(game, random.Random(rng.getrandbits(64)))
+        stats.add(game)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+def simulate(columns, rows, num_mines, num_games, strategy='solver', workers=None, seed=0, chunk_size=100, progress=None):
+    """Plays num_games games in a process pool and returns the merged Statistics.
+    The games are split into chunks of chunk_size games. Runs with the same
+    seed and chunk size play the same games regardless of the number of workers.
+    progress is called with the Statistics merged so far after each chunk.
+    If workers is 1, all games are played in the current process.
+    """
+    load_strategy(strategy) # fail early for unknown strategies
+    tasks = []
+    for index, start in enumerate(range(0, num_games, chunk_size)):
+        tasks.append((seed, index, min(chunk_size, num_games - start), columns, rows, num_mines, strategy))
+
+    total = Statistics()
+    pool = None if workers == 1 else multiprocessing.Pool(workers)
+    try:
+        results = map(play_chunk, tasks) if pool is None else pool.imap_unordered(play_chunk, tasks)
+        for stats in results:
+            total.merge(stats)
+            if progress is not None:
+                progress(total)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return total
+
+def parse_size(text):
+    """Parses a board size given as COLUMNSxROWS.
+    >>> parse_size('30x16')
+    (30, 16)
+    """
+    columns, rows = text.lower().split('x')
+    return (int(columns), int(rows))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=parse_size, default=(30, 16), help='board size as COLUMNSxROWS')
+    parser.add_argument('--mines', type=int, default=99, help='number of mines')
+    parser.add_argument('--games', type=int, default=1000, help='number of games')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes')
+    parser.add_argument('--strategy', default='solver',
+        help='one of {0} or module:function'.format(', '.join(sorted(STRATEGIES))))
+    parser.add_argument('--seed', type=int, default=0, help='seed of the whole run')
+    parser.add_argument('--chunk-size', type=int, default=100, help='games per task sent to a worker')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    columns, rows = args.size
+    start = time.perf_counter()
+
+    def progress(stats):
+        if not args.json:
+            print('\r{0}/{1} games'.format(stats.games, args.games), end='', flush=True)
+
+    stats = simulate(columns, rows, args.mines, args.games, args.strategy, args.workers,
+        args.seed, args.chunk_size, progress)
+    elapsed = time.perf_counter() - start
+
+    summary = stats.summary()
+    summary['seconds'] = elapsed
+    summary['games_per_second'] = stats.games/elapsed
+    summary['moves_per_second'] = stats.moves/elapsed
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print()
+        for name, value in summary.items():
+            print('{0:>22}: {1}'.format(name, value))
+
+if __name__ == '__main__':
+    main()
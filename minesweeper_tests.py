@@ -1,9 +1,38 @@
+import asyncio
+import io
+import json
+import os
+import random
+import struct
+import tempfile
+import time
 import unittest
-from table import Table
+import minesweeper
+from table import Table, PackedTable
 from minesweeper import Game, Flags
+from chunked import ChunkedGame
+from bitboard import BitboardGame
+from sparse import SparseGame, MineTable
+from solver import Solver
+from probability import Probabilities
+import minesweeper_sim
+import minesweeper_bench
+import savefile
+import journal
+import instrumentation
+import minesweeper_generate
+from factory import BoardFactory
+import batch
+import minesweeper_server
+import minesweeper_load
 
 class MinesweeperTest(unittest.TestCase):
+    # the tests run for every game backend through subclasses that replace the class
+    game_class = Game
+
     def setUp(self):
+        Game.check_consistency = True
+        self.addCleanup(setattr, Game, 'check_consistency', False)
         self.mines = Table.from_nested_list([
             [False, False, False, False],
             [False, True, False, False],
@@ -18,7 +47,7 @@ class MinesweeperTest(unittest.TestCase):
         ])
 
     def test_reveal_hint(self):
-        game = Game(self.mines, self.flags)
+        game = self.game_class(self.mines, self.flags)
         self.assertEqual(True, game.reveal(0, 0))
         self.assertEqual(self.flags, Table.from_nested_list([
             [Flags.Revealed, Flags.Unknown, Flags.Unknown, Flags.Unknown],
@@ -28,7 +57,7 @@ class MinesweeperTest(unittest.TestCase):
         ]))
 
     def test_reveal_mine(self):
-        game = Game(self.mines, self.flags)
+        game = self.game_class(self.mines, self.flags)
         self.assertEqual(False, game.reveal(1, 1))
         self.assertEqual(self.flags, Table.from_nested_list([
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
@@ -38,7 +67,7 @@ class MinesweeperTest(unittest.TestCase):
         ]))
 
     def test_reveal_empty(self):
-        game = Game(self.mines, self.flags)
+        game = self.game_class(self.mines, self.flags)
         self.assertEqual(True, game.reveal(3, 3))
         self.assertEqual(self.flags, Table.from_nested_list([
             [Flags.Unknown, Flags.Unknown, Flags.Revealed, Flags.Revealed],
@@ -54,7 +83,7 @@ class MinesweeperTest(unittest.TestCase):
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
         ])
-        game = Game(self.mines, self.flags)
+        game = self.game_class(self.mines, self.flags)
         self.assertEqual(True, game.reveal(0, 0))
         self.assertEqual(self.flags, Table.from_nested_list([
             [Flags.Revealed, Flags.Unknown, Flags.Unknown, Flags.Unknown],
@@ -70,7 +99,7 @@ class MinesweeperTest(unittest.TestCase):
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
         ])
-        game = Game(self.mines, self.flags)
+        game = self.game_class(self.mines, self.flags)
         self.assertEqual(True, game.reveal(1, 1))
         self.assertEqual(self.flags, Table.from_nested_list([
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
@@ -86,7 +115,7 @@ class MinesweeperTest(unittest.TestCase):
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
         ])
-        game = Game(self.mines, self.flags)
+        game = self.game_class(self.mines, self.flags)
         self.assertEqual(True, game.reveal(0, 0))
         self.assertEqual(self.flags, Table.from_nested_list([
             [Flags.Revealed, Flags.Revealed, Flags.Unknown, Flags.Unknown],
@@ -95,5 +124,728 @@ class MinesweeperTest(unittest.TestCase):
             [Flags.Unknown, Flags.Unknown, Flags.Unknown, Flags.Unknown],
         ]))
 
+    def test_reveal_changed(self):
+        game = self.game_class(self.mines, self.flags)
+        game.reveal(3, 3)
+        self.assertEqual(12, len(game.changed))
+        self.assertEqual(12, len(set(game.changed)))
+        for x, y in game.changed:
+            self.assertEqual(Flags.Revealed, self.flags[x, y])
+        game.toggle_mark(0, 0)
+        self.assertEqual([(0, 0)], game.changed)
+
+    def test_reveal_large_region(self):
+        mines = Table(300, 300, False, dtype='u1')
+        mines[0, 0] = True
+        game = self.game_class(mines)
+        self.assertEqual(True, game.reveal(299, 299))
+        # the last field is revealed, so all mines get marked automatically
+        self.assertEqual(300*300-1, game.flags.count(Flags.Revealed))
+        self.assertEqual(Flags.Marked, game.flags[0, 0])
+        self.assertEqual(300*300, len(game.changed))
+
+    def test_reveal_known_mine(self):
+        self.flags[0, 0] = Flags.Revealed
+        self.flags[0, 1] = Flags.Marked
+        game = self.game_class(self.mines, self.flags)
+        self.assertEqual(False, game.reveal(0, 0))
+        self.assertEqual(Flags.Revealed, self.flags[1, 1])
+        self.assertEqual(True, game.is_lost())
+
+    def test_counters(self):
+        game = self.game_class(self.mines, self.flags)
+        self.assertEqual(1, game.remaining_mines())
+        game.toggle_mark(0, 0)
+        self.assertEqual(0, game.remaining_mines())
+        self.assertEqual(False, game.is_solved())
+        game.toggle_mark(0, 0)
+        game.toggle_mark(1, 1)
+        self.assertEqual(True, game.is_solved())
+        self.assertEqual(False, game.is_lost())
+
+    def test_check_counters(self):
+        game = self.game_class(self.mines, self.flags)
+        self.flags[1, 1] = Flags.Revealed
+        with self.assertRaises(AssertionError):
+            game.check_counters()
+
+    def test_snapshot_restore(self):
+        game = self.game_class(self.mines, self.flags)
+        start = game.snapshot()
+        game.toggle_mark(0, 0)
+        marked = game.snapshot()
+        game.reveal(3, 3)
+        revealed = list(game.flags)
+        game.restore(marked)
+        self.assertEqual(12, len(game.changed))
+        self.assertEqual(Flags.Marked, game.flags[0, 0])
+        self.assertEqual(Flags.Unknown, game.flags[3, 3])
+        game.restore(start)
+        self.assertEqual([Flags.Unknown]*16, list(game.flags))
+        # redo
+        game.restore(marked + 12)
+        self.assertEqual(revealed, list(game.flags))
+        # a new move discards the undone changes
+        game.restore(marked)
+        game.toggle_mark(3, 3)
+        with self.assertRaises(ValueError):
+            game.restore(marked + 12)
+        with self.assertRaises(ValueError):
+            self.game_class(self.mines).restore(0)
+
+    def test_text(self):
+        game = self.game_class(self.mines, self.flags)
+        game.reveal(0, 0)
+        game.toggle_mark(1, 1)
+        self.assertEqual('1???\n?!??\n????\n????\n', game.to_text())
+        self.assertEqual('1...\n.F..\n....\n....\n', game.to_text(board=True))
+        game.reveal(3, 3)
+        self.assertEqual('1?10\n?!10\n1110\n0000\n', game.to_text())
+
+        game = self.game_class.create_random(300, 200, 6000, seed=3, safe=(150, 100))
+        game.reveal(150, 100)
+        game.toggle_mark(0, 0)
+        loaded = self.game_class.from_text(game.to_text(board=True))
+        self.assertEqual(game.mines, loaded.mines)
+        self.assertEqual(game.flags, loaded.flags)
+        self.assertEqual(game.to_text(), loaded.to_text())
+        loaded.check_counters()
+
+        with self.assertRaises(ValueError):
+            self.game_class.from_text('1???')
+        with self.assertRaises(ValueError):
+            self.game_class.from_text('..\n...')
+        with self.assertRaises(ValueError):
+            self.game_class.from_text('')
+
+    def test_create_random_safe(self):
+        for seed in range(20):
+            game = self.game_class.create_random(5, 5, 16, seed=seed, safe=(2, 2))
+            self.assertEqual(16, game.num_mines)
+            self.assertEqual(0, game.hints[2, 2])
+            self.assertEqual(True, game.reveal(2, 2))
+            self.assertEqual(9, game.num_revealed_safe)
+        self.assertEqual(
+            self.game_class.create_random(30, 16, 99, seed=7).mines,
+            self.game_class.create_random(30, 16, 99, seed=7).mines)
+
+    def test_typed_tables(self):
+        mines = Table(4, 4, False, dtype='u1')
+        mines[1, 1] = True
+        game = self.game_class(mines)
+        self.assertEqual(True, game.reveal(3, 3))
+        self.assertEqual(game.flags, Table.from_nested_list([
+            [Flags.Unknown, Flags.Unknown, Flags.Revealed, Flags.Revealed],
+            [Flags.Unknown, Flags.Unknown, Flags.Revealed, Flags.Revealed],
+            [Flags.Revealed, Flags.Revealed, Flags.Revealed, Flags.Revealed],
+            [Flags.Revealed, Flags.Revealed, Flags.Revealed, Flags.Revealed],
+        ]))
+        self.assertEqual(game.hints, self.game_class(self.mines, self.flags).hints)
+
+class BitboardGameTest(MinesweeperTest):
+    game_class = BitboardGame
+
+    def test_same_moves(self):
+        # random moves on both backends change the same fields
+        rng = random.Random(5)
+        for seed in range(5):
+            game = Game.create_random(40, 30, 150, seed=seed)
+            bitboard = BitboardGame(Table.from_list(40, 30, game.mines, dtype='u1'))
+            self.assertEqual(game.hints, bitboard.hints)
+            for _ in range(60):
+                x, y = rng.randrange(40), rng.randrange(30)
+                if rng.random() < 0.2:
+                    game.toggle_mark(x, y)
+                    bitboard.toggle_mark(x, y)
+                else:
+                    self.assertEqual(game.reveal(x, y), bitboard.reveal(x, y))
+                self.assertEqual(sorted(game.changed), sorted(bitboard.changed))
+                self.assertEqual(game.flags, bitboard.flags)
+                self.assertEqual(game.is_solved(), bitboard.is_solved())
+                self.assertEqual(game.is_lost(), bitboard.is_lost())
+
+
+class SparseGameTest(MinesweeperTest):
+    game_class = SparseGame
+
+    def test_huge_board(self):
+        columns = rows = 100000
+        # a wall of mines closes the top left corner, the other mines are random
+        wall = [x + 20*columns for x in range(21)] + [20 + y*columns for y in range(20)]
+        rng = random.Random(1)
+        mines = MineTable(columns, rows, wall + [rng.randrange(100*columns, columns*rows) for _ in range(100000)])
+        game = SparseGame(mines)
+        self.assertEqual(True, game.reveal(0, 0))
+        # only the opened region is stored
+        self.assertEqual(20*20, game.num_revealed_safe)
+        self.assertEqual(20*20, len(game.flags.table))
+        self.assertEqual(5, game.hints[19, 19])
+        game.toggle_mark(20, 20)
+        self.assertEqual(game.num_mines - 1, game.remaining_mines())
+        self.assertEqual(game.hint(5000, 5000), sum(mines[n] for n in mines.neighbors(5000, 5000)))
+
+    def test_move_mines_away(self):
+        game = SparseGame.create_random(20, 20, 100, seed=3)
+        game.move_mines_away(10, 10, seed=1)
+        self.assertEqual(100, game.num_mines)
+        self.assertEqual(0, game.hints[10, 10])
+        self.assertEqual(Game(game.mines).hints, game.hints)
+
+    def test_save_hints(self):
+        game = SparseGame.create_random(20, 20, 10, seed=3)
+        with self.assertRaises(ValueError):
+            savefile.dumps(game, hints=True)
+        self.assertEqual(game.flags, savefile.loads(savefile.dumps(game)).flags)
+        # the planes of a huge sparse game are not expanded
+        with self.assertRaises(ValueError):
+            savefile.dumps(SparseGame(MineTable(100000, 100000, [5])))
+
+class TableViewTest(unittest.TestCase):
+    def test_storage_types(self):
+        for table in (Table(5, 4, 0), Table(5, 4, 0, dtype='u1'), PackedTable(5, 4, bits=2),
+                Table.from_buffer(5, 4, bytearray(20), dtype='u1')):
+            table[1:4, 1:3] = 2
+            table[0, :] = 1
+            self.assertEqual(Table.from_nested_list([
+                [1, 0, 0, 0, 0],
+                [1, 2, 2, 2, 0],
+                [1, 2, 2, 2, 0],
+                [1, 0, 0, 0, 0],
+            ]), table)
+            view = table[1:, 1:]
+            self.assertEqual([2, 2, 2, 0], view.row(1))
+            self.assertEqual(6, view.count(2))
+            self.assertEqual(table[2:, 1:3], view[1:, :2])
+
+    def test_overlapping_copy(self):
+        table = Table.from_list(4, 4, range(16), dtype='u1')
+        table[1:, 1:] = table[:3, :3]
+        self.assertEqual([0, 1, 2, 3, 4, 0, 1, 2, 8, 4, 5, 6, 12, 8, 9, 10], list(table))
+        with self.assertRaises(ValueError):
+            table[:2, :2] = table[:3, :3]
+        with self.assertRaises(ValueError):
+            table[::2, :]
+
+class HintsTest(unittest.TestCase):
+    def random_mines(self, columns, rows, seed):
+        rng = random.Random(seed)
+        return Table.from_list(columns, rows, [rng.random() < 0.3 for _ in range(columns*rows)])
+
+    def expected_hints(self, game):
+        columns, rows = game.mines.size()
+        return Table.from_list(columns, rows, [game.hint(x, y) for y in range(rows) for x in range(columns)])
+
+    def test_python_hints(self):
+        for seed, (columns, rows) in enumerate([(1, 1), (1, 5), (5, 1), (7, 5), (16, 30)]):
+            game = Game(self.random_mines(columns, rows, seed))
+            hints = minesweeper.compute_hints(game.mines, use_numpy=False)
+            self.assertEqual(self.expected_hints(game), hints)
+
+    @unittest.skipIf(minesweeper.numpy is None, 'numpy is not installed')
+    def test_numpy_hints(self):
+        for seed, (columns, rows) in enumerate([(1, 1), (1, 5), (5, 1), (7, 5), (16, 30)]):
+            game = Game(self.random_mines(columns, rows, seed))
+            hints = minesweeper.compute_hints(game.mines, use_numpy=True)
+            self.assertEqual(self.expected_hints(game), hints)
+
+class ChunkedGameTest(unittest.TestCase):
+    def test_deterministic(self):
+        a = ChunkedGame(seed=3, chunk_size=8)
+        b = ChunkedGame(seed=3, chunk_size=8)
+        # visit the chunks in a different order
+        self.assertEqual(a.hints[100, -100], b.hints[100, -100])
+        fields = [(x, y) for x in range(-20, 20) for y in range(-20, 20)]
+        self.assertEqual([a.mines[f] for f in fields], [b.mines[f] for f in reversed(fields)][::-1])
+        self.assertEqual([a.hints[f] for f in fields], [a.hint(*f) for f in fields])
+
+    def test_reveal(self):
+        game = ChunkedGame(seed=4, chunk_size=8)
+        game.check_consistency = True
+        x = next(x for x in range(1000) if game.hints[x, 0] == 0)
+        self.assertEqual(True, game.reveal(x, 0))
+        self.assertEqual(len(game.changed), game.num_revealed_safe)
+        for fx, fy in game.changed:
+            self.assertEqual(Flags.Revealed, game.flags[fx, fy])
+        self.assertEqual(False, game.is_solved())
+        # only the chunks around the revealed region exist
+        self.assertLess(len(game.flags.chunks), 20)
+
+    def test_reveal_known(self):
+        game = ChunkedGame(seed=4, chunk_size=8)
+        game.check_consistency = True
+        x = next(x for x in range(1000) if game.hints[x, 0] > 0 and not game.mines[x, 0])
+        game.reveal(x, 0)
+        neighbors = list(game.mines.neighbors(x, 0))
+        for n in neighbors:
+            if game.mines[n]:
+                game.toggle_mark(*n)
+        self.assertEqual(True, game.reveal(x, 0))
+        self.assertEqual([], [n for n in neighbors if game.flags[n] == Flags.Unknown])
+
+    def test_density(self):
+        with self.assertRaises(ValueError):
+            ChunkedGame(seed=1, density=0.1)
+
+class SolverTest(unittest.TestCase):
+    def test_solve(self):
+        mines = Table(4, 4, False)
+        mines[1, 1] = True
+        game = Game(mines)
+        game.reveal(3, 3)
+        solver = Solver(game)
+        self.assertLess(0, solver.solve())
+        self.assertEqual(True, game.is_solved())
+
+    def test_subset_rule(self):
+        # the hints 1 2 1 in the middle row only allow mines in the corners
+        mines = Table.from_nested_list([
+            [True, False, True],
+            [False, False, False],
+            [False, False, False],
+        ])
+        flags = Table.from_nested_list([
+            [Flags.Unknown, Flags.Unknown, Flags.Unknown],
+            [Flags.Revealed, Flags.Revealed, Flags.Revealed],
+            [Flags.Revealed, Flags.Revealed, Flags.Revealed],
+        ])
+        game = Game(mines, flags)
+        solver = Solver(game)
+        safe, mines = solver.deduce()
+        self.assertEqual(set(), safe)
+        self.assertEqual({(0, 0), (2, 0)}, mines)
+        solver.update(mines)
+        solver.solve()
+        self.assertEqual(True, game.is_solved())
+
+    def test_never_loses(self):
+        for seed in range(10):
+            game = Game.create_random(16, 16, 40, seed=seed, safe=(8, 8))
+            game.check_consistency = True
+            game.reveal(8, 8)
+            Solver(game).solve()
+            self.assertEqual(False, game.is_lost())
+
+class ProbabilitiesTest(unittest.TestCase):
+    def test_probabilities(self):
+        # two mines, one of them next to the revealed corner
+        mines = Table.from_nested_list([
+            [False, False, False],
+            [False, True, False],
+            [False, False, True],
+        ])
+        game = Game(mines)
+        game.reveal(0, 0)
+        frontier, interior = Probabilities(game).mine_probabilities()
+        # one of the 3 neighbors is a mine, the other mine is in one of the 5 other fields
+        for field in [(1, 0), (0, 1), (1, 1)]:
+            self.assertAlmostEqual(1/3, frontier[field])
+        self.assertAlmostEqual(1/5, interior)
+
+    def test_update(self):
+        game = Game.create_random(16, 16, 40, seed=3, safe=(8, 8))
+        game.reveal(8, 8)
+        probabilities = Probabilities(game)
+        frontier, _ = probabilities.mine_probabilities()
+        safe = min(f for f in frontier if not game.mines[f])
+        game.reveal(*safe)
+        probabilities.update(game.changed)
+        updated = probabilities.mine_probabilities()
+        expected = Probabilities(game).mine_probabilities()
+        self.assertEqual(expected[0].keys(), updated[0].keys())
+        for field, p in expected[0].items():
+            self.assertAlmostEqual(p, updated[0][field])
+        self.assertAlmostEqual(expected[1], updated[1])
+
+class SimulationTest(unittest.TestCase):
+    def test_reproducible(self):
+        single = minesweeper_sim.simulate(8, 8, 10, 12, 'solver', workers=1, seed=5, chunk_size=4)
+        pool = minesweeper_sim.simulate(8, 8, 10, 12, 'solver', workers=2, seed=5, chunk_size=4)
+        single, pool = single.summary(), pool.summary()
+        del single['cpu_seconds'], pool['cpu_seconds']
+        self.assertEqual(single, pool)
+        self.assertEqual(12, single['won'] + single['lost'])
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run_and_compare(self):
+        baseline = minesweeper_bench.run_benchmarks(sorted(minesweeper_bench.BENCHMARKS), [(8, 4)], repeat=1)
+        self.assertEqual(len(minesweeper_bench.BENCHMARKS), len(baseline['results']))
+        current = {'results': {key: dict(result) for key, result in baseline['results'].items()}}
+        current['results']['status@8x4']['seconds'] *= 2
+        rows, regressions = minesweeper_bench.compare(baseline, current, 0.5)
+        self.assertEqual(len(baseline['results']), len(rows))
+        self.assertEqual(['status@8x4'], regressions)
+
+class SaveTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'game.msw')
+        self.game = Game.create_random(13, 7, 20, seed=2, safe=(6, 3))
+        self.game.reveal(6, 3)
+        self.game.toggle_mark(0, 0)
+
+    def test_round_trip(self):
+        for hints in (False, True):
+            for use_mmap in (False, True):
+                self.game.save(self.path, hints=hints)
+                game = Game.load(self.path, use_mmap=use_mmap)
+                self.assertEqual(self.game.mines, game.mines)
+                self.assertEqual(self.game.flags, game.flags)
+                self.assertEqual(self.game.hints, game.hints)
+                game.check_counters()
+
+    def test_changes_stay_in_memory(self):
+        self.game.save(self.path)
+        game = Game.load(self.path)
+        game.toggle_mark(12, 6)
+        self.assertEqual(Flags.Marked, game.flags[12, 6])
+        self.assertEqual(self.game.flags, Game.load(self.path).flags)
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a game' * 10)
+        with self.assertRaises(ValueError):
+            Game.load(self.path)
+
+    def test_wrong_counters(self):
+        data = bytearray(savefile.dumps(self.game))
+        # the counters follow magic, version, header size, columns and rows
+        offset = struct.calcsize('<4sHHII')
+        for name, value in (('num_mines', 21), ('num_marked_mines', 2)):
+            changed = bytearray(data)
+            index = Game.COUNTERS.index(name)
+            struct.pack_into('<Q', changed, offset + 8*index, value)
+            with self.assertRaises(ValueError):
+                savefile.loads(changed)
+        savefile.loads(data).check_counters()
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'game.journal')
+        self.game = Game.create_random(16, 12, 30, seed=4, safe=(8, 6))
+
+    def play(self, recording, moves):
+        """Makes random moves and returns the flags after each move."""
+        rng = random.Random(1)
+        snapshots = [list(self.game.flags)]
+        for _ in range(moves):
+            x, y = rng.randrange(16), rng.randrange(12)
+            if rng.random() < 0.3:
+                self.game.toggle_mark(x, y)
+            else:
+                self.game.reveal(x, y, reveal_known=rng.random() < 0.5)
+            snapshots.append(list(self.game.flags))
+        recording.file.flush()
+        return snapshots
+
+    def test_replay(self):
+        recording = journal.Journal.create(self.path, self.game, checkpoint_interval=7)
+        snapshots = self.play(recording, 40)
+        recording.close()
+        contents = journal.read(self.path)
+        self.assertEqual(40, len(contents.moves))
+        self.assertEqual(5, len(contents.checkpoints))
+        for move, flags in enumerate(snapshots):
+            game = contents.replay(move)
+            self.assertEqual(flags, list(game.flags))
+            game.check_counters()
+        self.assertEqual(snapshots[-1], list(journal.replay(self.path).flags))
+        with self.assertRaises(IndexError):
+            contents.replay(41)
+
+    def test_resume_truncated(self):
+        recording = journal.Journal.create(self.path, self.game, checkpoint_interval=0)
+        snapshots = self.play(recording, 10)
+        recording.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as f:
+            f.truncate(size - 1)
+        recording = journal.Journal.resume(self.path)
+        self.assertEqual(9, recording.moves)
+        self.assertEqual(snapshots[9], list(recording.game.flags))
+        recording.game.toggle_mark(0, 0)
+        recording.close()
+        self.assertEqual(10, len(journal.read(self.path).moves))
+
+    def test_restore(self):
+        recording = journal.Journal.create(self.path, self.game)
+        snapshot = self.game.snapshot()
+        self.game.reveal(8, 6)
+        self.game.restore(snapshot)
+        self.game.toggle_mark(0, 0)
+        recording.close()
+        self.assertEqual(list(self.game.flags), list(journal.replay(self.path).flags))
+
+    def test_seek_across_restore(self):
+        recording = journal.Journal.create(self.path, self.game, checkpoint_interval=2)
+        snapshots = [list(self.game.flags)]
+        snapshot = self.game.snapshot()
+        for move in (lambda: self.game.reveal(8, 6), lambda: self.game.toggle_mark(0, 0),
+                lambda: self.game.restore(snapshot), lambda: self.game.toggle_mark(0, 0)):
+            move()
+            snapshots.append(list(self.game.flags))
+        recording.close()
+        contents = journal.read(self.path)
+        self.assertEqual(4, len(contents.moves))
+        # the restore is the third move and writes no checkpoint of its own
+        self.assertEqual([2, 4], [checkpoint[0] for checkpoint in contents.checkpoints])
+        for move, flags in enumerate(snapshots):
+            game = contents.replay(move)
+            self.assertEqual(flags, list(game.flags))
+            game.check_counters()
+        recording = journal.Journal.resume(self.path)
+        self.assertEqual(4, recording.moves)
+        recording.close()
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a journal')
+        with self.assertRaises(ValueError):
+            journal.read(self.path)
+
+    def test_truncated_header(self):
+        journal.Journal.create(self.path, self.game).close()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # the magic, the version and a size with two bytes
+        for size in (4, 5, 6):
+            with open(self.path, 'wb') as f:
+                f.write(data[:size])
+            with self.assertRaises(ValueError):
+                journal.read(self.path)
+
+class ServerTest(unittest.TestCase):
+    def run_with_server(self, function):
+        """Runs a coroutine function with the port of a running server."""
+        async def run():
+            sessions = minesweeper_server.Server()
+            server = await sessions.start()
+            async with server:
+                result = await function(server.sockets[0].getsockname()[1])
+                # let the connections see that the clients closed them
+                await sessions.idle.wait()
+                return result
+        return asyncio.run(run())
+
+    def test_session(self):
+        game = Game.create_random(16, 12, 30, seed=5, safe=(8, 6))
+        async def play(port):
+            client = await minesweeper_load.Client.connect('127.0.0.1', port)
+            try:
+                await client.new(16, 12, 30, safe=(8, 6), seed=5)
+                response = await client.move('reveal', 8, 6)
+                game.reveal(8, 6)
+                self.assertEqual(len(game.changed), len(response['changed']))
+                await client.move('mark', 0, 0)
+                game.toggle_mark(0, 0)
+                state = await client.request(op='state')
+                with self.assertRaises(ValueError):
+                    await client.move('reveal', 16, 0)
+                with self.assertRaises(ValueError):
+                    await client.request(op='jump')
+                return client.board, state
+            finally:
+                client.close()
+        board, state = self.run_with_server(play)
+        expected = [''.join(minesweeper_server.cell(game, x, y) for x in range(16)) for y in range(12)]
+        self.assertEqual(expected, [''.join(row) for row in board])
+        self.assertEqual(expected, state['board'])
+        self.assertEqual(game.remaining_mines(), state['remaining'])
+
+    def test_invalid_requests(self):
+        async def send(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                responses = []
+                for line in (b'{"op": ["x"]}\n', b'[1]\n', b'{"op": "state"}\n',
+                        b'{"op": "new", "columns": 5, "rows": 5, "mines": 1, "safe": [9, 9]}\n',
+                        b'{"op": "new", "columns": 1e400, "rows": 5, "mines": 1}\n',
+                        b'{"op": "new", "columns": 100000, "rows": 100000, "mines": 1}\n',
+                        b'{"op": "new", "columns": 5, "rows": 5, "mines": 1}\n',
+                        b'{"op": "reveal", "x": Infinity, "y": 0}\n',
+                        b'x'*(minesweeper_server.LINE_LIMIT + 1) + b'\n'):
+                    writer.write(line)
+                    responses.append(json.loads(await reader.readline()))
+                # the connection is closed after a line that is too long
+                responses.append(await reader.readline())
+                return responses
+            finally:
+                writer.close()
+        responses = self.run_with_server(send)
+        self.assertEqual([True, True, True, True, True, True, False, True, True],
+            ['error' in response for response in responses[:9]])
+        self.assertEqual(b'', responses[9])
+
+    def test_load(self):
+        # run every request in the executor
+        previous = minesweeper_server.OFFLOAD_FIELDS
+        minesweeper_server.OFFLOAD_FIELDS = 0
+        self.addCleanup(setattr, minesweeper_server, 'OFFLOAD_FIELDS', previous)
+        results = self.run_with_server(lambda port: minesweeper_load.run_load('127.0.0.1', port, 5, 40, 9, 9, 10))
+        self.assertEqual(40, results['moves'])
+        self.assertEqual(40 + results['games'], results['requests'])
+        self.assertLessEqual(results['new_latency_p50'], results['new_latency_p99'])
+        self.assertLessEqual(results['latency_p50'], results['latency_p99'])
+
+class InstrumentationTest(unittest.TestCase):
+    def test_enable_disable(self):
+        reveal = Game.reveal
+        stats = instrumentation.enable(classes=(Game, ChunkedGame))
+        self.addCleanup(instrumentation.disable)
+        self.assertIs(stats, instrumentation.active)
+        self.assertIsNot(reveal, Game.reveal)
+
+        game = Game.create_random(10, 10, 10, seed=1, safe=(5, 5))
+        game.reveal(5, 5)
+        game.toggle_mark(0, 0)
+        game.is_lost()
+        ChunkedGame(seed=1).is_solved()
+        self.assertEqual(1, stats.timings['reveal'].count)
+        self.assertEqual(1, stats.timings['toggle_mark'].count)
+        self.assertEqual(1, stats.timings['is_solved'].count)
+        self.assertEqual(1, sum(stats.cascades.values()))
+
+        f = io.StringIO()
+        stats.dump(f)
+        self.assertEqual(1, json.loads(f.getvalue())['timings']['is_lost']['count'])
+
+        instrumentation.disable()
+        self.assertIs(reveal, Game.reveal)
+        self.assertIsNone(instrumentation.active)
+        Game.create_random(10, 10, 10, seed=1).reveal(0, 0)
+        self.assertEqual(1, stats.timings['reveal'].count)
+
+class GeneratorTest(unittest.TestCase):
+    def test_generate(self):
+        seeds, attempts = minesweeper_generate.generate(9, 9, 10, 3, workers=1, seed=1)
+        self.assertEqual(3, len(seeds))
+        self.assertGreaterEqual(attempts, 3)
+        self.assertEqual(seeds, minesweeper_generate.generate(9, 9, 10, 3, workers=1, seed=1)[0])
+        first = minesweeper_generate.opening(9, 9)
+        for seed in seeds:
+            game = Game.create_random(9, 9, 10, seed=seed, safe=first)
+            self.assertTrue(minesweeper_generate.is_no_guess(game, first))
+        with self.assertRaises(ValueError):
+            minesweeper_generate.generate(9, 9, 60, 1, workers=1, max_attempts=20)
+
+    def test_pool(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        pool = minesweeper_generate.BoardPool(os.path.join(directory.name, 'pool'))
+        self.assertIsNone(pool.take(9, 9, 10))
+        self.assertEqual(2, pool.fill(9, 9, 10, 2, workers=1, seed=3))
+        self.assertEqual(0, pool.fill(9, 9, 10, 2, workers=1))
+        self.assertEqual([], pool.seeds(9, 8, 10))
+        seeds = pool.seeds(9, 9, 10)
+        game = pool.take(9, 9, 10)
+        self.assertGreater(game.num_revealed_safe, 0)
+        Solver(game).solve()
+        self.assertTrue(game.is_solved())
+        self.assertEqual(seeds[1:], pool.seeds(9, 9, 10))
+
+class FactoryTest(unittest.TestCase):
+    def test_take(self):
+        factory = BoardFactory(queue_size=1)
+        self.addCleanup(factory.close)
+        game = factory.take(9, 9, 10)
+        self.assertEqual({'hits': 0, 'misses': 1}, {k: factory.summary()[k] for k in ('hits', 'misses')})
+        # wait for the background thread to refill the queue
+        for _ in range(1000):
+            with factory.condition:
+                if factory.queues[9, 9, 10]:
+                    break
+            time.sleep(0.01)
+        other = factory.take(9, 9, 10)
+        self.assertEqual(1, factory.summary()['hits'])
+        self.assertIsNot(game, other)
+        self.assertEqual(10, other.num_mines)
+
+    def test_errors(self):
+        def create(columns, rows, num_mines):
+            raise ValueError('Cannot place {0} mines'.format(num_mines))
+        factory = BoardFactory(create=create)
+        self.addCleanup(factory.close)
+        factory.prefetch(3, 3, 10)
+        for _ in range(1000):
+            if factory.summary()['errors']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(1, factory.summary()['errors'])
+        with self.assertRaises(ValueError):
+            factory.take(3, 3, 10)
+        # the thread is still running
+        factory.create = Game.create_random
+        factory.prefetch(3, 3, 1)
+        for _ in range(1000):
+            with factory.condition:
+                if factory.queues[3, 3, 1]:
+                    break
+            time.sleep(0.01)
+        self.assertEqual(1, factory.take(3, 3, 1).num_mines)
+        self.assertEqual(1, factory.summary()['hits'])
+
+    def test_move_mines_away(self):
+        for seed in range(20):
+            game = Game.create_random(9, 9, 40, seed=seed)
+            game.move_mines_away(4, 4, seed=seed)
+            self.assertEqual(40, game.mines.count(True))
+            self.assertEqual(0, game.hints[4, 4])
+            self.assertEqual(minesweeper.compute_hints(game.mines), game.hints)
+        game.reveal(4, 4)
+        with self.assertRaises(ValueError):
+            game.move_mines_away(0, 0)
+        with self.assertRaises(ValueError):
+            Game.create_random(3, 3, 8).move_mines_away(1, 1)
+
+@unittest.skipIf(batch.numpy is None, 'numpy is not installed')
+class GameBatchTest(unittest.TestCase):
+    def test_same_moves(self):
+        # random moves on a batch and on a Game per board change the same fields
+        games = batch.GameBatch.create_random(50, 9, 8, 10, seed=1)
+        boards = [games.game(i) for i in range(len(games))]
+        self.assertEqual(boards[3].hints.tobytes(), games.hints[3].tobytes())
+        rng = random.Random(2)
+        for _ in range(40):
+            actions = [rng.choice([batch.SKIP, batch.REVEAL, batch.REVEAL, batch.REVEAL, batch.MARK]) for _ in boards]
+            x = [rng.randrange(9) for _ in boards]
+            y = [rng.randrange(8) for _ in boards]
+            won, lost, changed = games.step(actions, x, y)
+            for i, game in enumerate(boards):
+                game.changed = []
+                if actions[i] == batch.REVEAL:
+                    game.reveal(x[i], y[i])
+                elif actions[i] == batch.MARK:
+                    game.toggle_mark(x[i], y[i])
+                self.assertEqual(game.flags.tobytes(), games.flags[i].tobytes())
+                self.assertEqual(sorted(game.changed), sorted(zip(*changed[i].nonzero()[::-1])))
+                self.assertEqual((game.is_solved(), game.is_lost()), (won[i], lost[i]))
+
+    def test_create_random(self):
+        games = batch.GameBatch.create_random(100, 5, 5, 16, seed=1, safe=(2, 2))
+        self.assertEqual([16]*100, games.num_mines.tolist())
+        won, lost, changed = games.step([batch.REVEAL]*100, [2]*100, [2]*100)
+        # the safe fields are all revealed, so the mines are marked and the games won
+        self.assertFalse(lost.any())
+        self.assertTrue(won.all())
+        self.assertEqual([25]*100, changed.sum(axis=(1, 2)).tolist())
+        with self.assertRaises(ValueError):
+            batch.GameBatch.create_random(1, 3, 3, 1, safe=(1, 1))
+        with self.assertRaises(ValueError):
+            games.step([batch.REVEAL], [0], [0])
+        for safe in ((-1, 2), (5, 0)):
+            with self.assertRaises(IndexError):
+                batch.GameBatch.create_random(1, 5, 5, 1, safe=safe)
+
+    def test_step_outside(self):
+        games = batch.GameBatch.create_random(2, 5, 5, 3, seed=1)
+        # the field of a skipped board is ignored
+        won, lost, changed = games.step([batch.SKIP, batch.MARK], [99, 0], [-1, 0])
+        self.assertEqual([0, 1], changed.sum(axis=(1, 2)).tolist())
+        for x, y in ((-1, 0), (0, 5)):
+            with self.assertRaises(IndexError):
+                games.step([batch.SKIP, batch.REVEAL], [0, x], [0, y])
+
 if __name__ == '__main__':
     unittest.main()
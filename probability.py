@@ -0,0 +1,218 @@
+"""Computes the exact probability of each unknown field of a minesweeper game to be a mine"""
+
+import math
+from minesweeper import Flags
+
+class Probabilities:
+    """Exact mine probabilities of the Unknown fields of a bounded game.
+    Like the solver, only the flags and the hints of revealed fields are
+    used and marks are trusted. The Unknown fields next to revealed fields
+    (the frontier) are split into components that share no constraint.
+    All mine configurations of a component are counted by going through its
+    fields one by one while merging partial configurations that leave the
+    same number of mines for every constraint. Components are combined by
+    weighting their mine counts with the number of ways to place the
+    remaining mines on the Unknown fields away from the frontier (the
+    interior), which all have the same probability.
+    The results of a component are cached as long as its constraints do not
+    change, so after a move only the components next to the changed fields
+    are counted again.
+    """
+    def __init__(self, game):
+        if game.remaining_mines() is None:
+            raise ValueError('Probabilities require a game with a known number of mines')
+        self.game = game
+        # constraints of the revealed fields next to Unknown fields
+        self.constraints = {}
+        self.cache = {}
+        for y in range(game.row_count()):
+            for x in range(game.column_count()):
+                if game.flags[x, y] == Flags.Revealed:
+                    self._update_constraint(x, y)
+
+    def _update_constraint(self, x, y):
+        """Recomputes the constraint of a single field."""
+        self.constraints.pop((x, y), None)
+        if self.game.flags[x, y] != Flags.Revealed or self.game.mines[x, y]:
+            return
+        unknown = []
+        count = self.game.hints[x, y]
+        for n in self.game.mines.neighbors(x, y):
+            f = self.game.flags[n]
+            if f == Flags.Unknown:
+                unknown.append(n)
+            elif f == Flags.Marked:
+                count -= 1
+        if unknown:
+            self.constraints[x, y] = (frozenset(unknown), count)
+
+    def update(self, fields):
+        """Updates the constraints affected by changed fields."""
+        for x, y in fields:
+            self._update_constraint(x, y)
+            for n in self.game.mines.neighbors(x, y):
+                self._update_constraint(*n)
+
+    def components(self):
+        """Returns the constraints grouped into independent components."""
+        by_field = {}
+        for constraint in set(self.constraints.values()):
+            for field in constraint[0]:
+                by_field.setdefault(field, []).append(constraint)
+        components = []
+        seen = set()
+        for constraint in set(self.constraints.values()):
+            if constraint in seen:
+                continue
+            seen.add(constraint)
+            component = [constraint]
+            i = 0
+            while i < len(component):
+                for field in component[i][0]:
+                    for other in by_field[field]:
+                        if other not in seen:
+                            seen.add(other)
+                            component.append(other)
+                i += 1
+            components.append(frozenset(component))
+        return components
+
+    def mine_probabilities(self):
+        """Returns a tuple of a dict with the probability of every frontier
+        field and the probability of every interior field.
+        The interior probability is None if there are no interior fields.
+        Raises a ValueError if the flags contradict the hints.
+        """
+        game = self.game
+        components = self.components()
+        self.cache = {c: self.cache[c] if c in self.cache else count_configurations(c) for c in components}
+        results = [self.cache[c] for c in components]
+
+        num_frontier = sum(len(fields) for fields, _ in results)
+        num_fields = game.column_count()*game.row_count()
+        num_unknown = num_fields - game.num_revealed_safe - game.num_revealed_mines - game.num_marked
+        num_interior = num_unknown - num_frontier
+        num_mines = game.remaining_mines()
+
+        def weight(k):
+            """Number of ways to place the mines left over by the frontier in the interior."""
+            if 0 <= num_mines - k <= num_interior:
+                return math.comb(num_interior, num_mines - k)
+            return 0
+
+        # distributions of the number of mines in all components before and after each component
+        distributions = [{k: ways for k, (ways, _) in configurations.items()} for _, configurations in results]
+        prefix = [{0: 1}]
+        for d in distributions:
+            prefix.append(convolve(prefix[-1], d))
+        suffix = [{0: 1}]
+        for d in reversed(distributions):
+            suffix.append(convolve(suffix[-1], d))
+        suffix.reverse()
+
+        total = sum(ways*weight(k) for k, ways in prefix[-1].items())
+        if total == 0:
+            raise ValueError('The flags contradict the hints')
+
+        probabilities = {}
+        for i, (fields, configurations) in enumerate(results):
+            others = convolve(prefix[i], suffix[i+1])
+            mine_ways = [0]*len(fields)
+            for k, (_, field_ways) in configurations.items():
+                w = sum(ways*weight(k + o) for o, ways in others.items())
+                if w:
+                    for j, f in enumerate(field_ways):
+                        mine_ways[j] += f*w
+            for field, ways in zip(fields, mine_ways):
+                probabilities[field] = ways/total
+
+        interior = None
+        if num_interior > 0:
+            interior_ways = sum(ways*weight(k)*(num_mines - k) for k, ways in prefix[-1].items())
+            interior = interior_ways/(total*num_interior)
+        return (probabilities, interior)
+
+def convolve(a, b):
+    """Returns the distribution of the sum of two independent mine counts.
+    >>> convolve({0: 1, 1: 2}, {1: 3})
+    {1: 3, 2: 6}
+    """
+    result = {}
+    for ka, wa in a.items():
+        for kb, wb in b.items():
+            result[ka+kb] = result.get(ka+kb, 0) + wa*wb
+    return result
+
+def count_configurations(constraints):
+    """Counts the mine configurations of the fields of a component.
+    Returns a tuple of the fields and a dict that maps every possible number
+    of mines to the number of configurations and, for every field, the number
+    of these configurations in which the field is a mine.
+    >>> fields, configurations = count_configurations([(frozenset([(0, 0), (1, 0)]), 1)])
+    >>> fields
+    [(0, 0), (1, 0)]
+    >>> configurations
+    {1: (2, [1, 1])}
+    """
+    constraints = list(constraints)
+    by_field = {}
+    for j, (fields, _) in enumerate(constraints):
+        for field in fields:
+            by_field.setdefault(field, []).append(j)
+
+    # visit the fields breadth first, so constraints are completed soon after they are started
+    order = []
+    visited = set()
+    for start in sorted(by_field):
+        if start in visited:
+            continue
+        visited.add(start)
+        queue = [start]
+        while queue:
+            field = queue.pop(0)
+            order.append(field)
+            for j in by_field[field]:
+                for other in sorted(constraints[j][0]):
+                    if other not in visited:
+                        visited.add(other)
+                        queue.append(other)
+
+    # the number of fields of each constraint that are visited after each field
+    position = {field: i for i, field in enumerate(order)}
+    checks = []
+    for field in order:
+        i = position[field]
+        checks.append([(j, sum(1 for f in constraints[j][0] if position[f] > i)) for j in by_field[field]])
+
+    # partial configurations with the same remaining mines per constraint are merged
+    n = len(order)
+    states = {tuple(count for _, count in constraints): {0: (1, [0]*n)}}
+    for i in range(n):
+        next_states = {}
+        for remaining, counts in states.items():
+            for mine in (0, 1):
+                new = list(remaining)
+                valid = True
+                for j, left in checks[i]:
+                    new[j] -= mine
+                    if not 0 <= new[j] <= left:
+                        valid = False
+                        break
+                if not valid:
+                    continue
+                target = next_states.setdefault(tuple(new), {})
+                for k, (ways, field_ways) in counts.items():
+                    if mine:
+                        field_ways = list(field_ways)
+                        field_ways[i] += ways
+                    if k+mine in target:
+                        old_ways, old_field_ways = target[k+mine]
+                        target[k+mine] = (old_ways + ways, [a + b for a, b in zip(old_field_ways, field_ways)])
+                    else:
+                        target[k+mine] = (ways, field_ways)
+        states = next_states
+
+    configurations = {}
+    for counts in states.values():
+        configurations.update(counts)
+    return (order, configurations)
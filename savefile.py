@@ -0,0 +1,119 @@
+"""Reads and writes minesweeper games in a compact binary format
+
+A file consists of a header followed by planes with the state of all fields
+in linear index order:
+1. The mines with 1 bit per field
+2. The flags with 2 bits per field
+3. Optionally the hints with 1 signed byte per field
+The bits are packed with table.pack_bits. The header stores the counters of
+the game, so a game can be opened without scanning the planes. If the hints
+are stored as well, a memory mapped game is usable instantly no matter how
+large it is and only the parts that are accessed are read from disk.
+
+Readers skip unknown header fields after the fields of their version, so
+later versions may append fields to the header or new planes after the
+existing ones.
+"""
+
+import io
+import mmap
+import struct
+from minesweeper import Game, compute_hints
+from table import PackedTable, Table, pack_bits
+
+MAGIC = b'MSWP'
+VERSION = 1
+# magic, version, header size, columns, rows, counters, options, reserved
+HEADER = struct.Struct('<4sHHIIQQQQQII')
+# the hints plane is stored
+OPTION_HINTS = 1
+# games whose tables do not store every cell are only written up to this
+# many fields, since their planes are expanded to a byte per field
+MAX_SPARSE_FIELDS = 10**7
+
+def plane_sizes(columns, rows):
+    """Returns the sizes in bytes of the mines, flags and hints planes."""
+    num_fields = columns*rows
+    return ((num_fields + 7)//8, (num_fields*2 + 7)//8, num_fields)
+
+def write(game, f, hints=False):
+    """Writes a bounded game to a binary file object."""
+    columns, rows = game.column_count(), game.row_count()
+    if columns is None or rows is None:
+        raise ValueError('Only bounded games can be saved')
+    if hints and not game.hints.dense:
+        raise ValueError('The hints of the game are computed when they are read and cannot be saved')
+    if columns*rows > MAX_SPARSE_FIELDS and not (game.mines.dense and game.flags.dense):
+        raise ValueError('Games with sparse tables of more than {0} fields cannot be saved'.format(MAX_SPARSE_FIELDS))
+    options = OPTION_HINTS if hints else 0
+    counters = [getattr(game, name) for name in Game.COUNTERS]
+    f.write(HEADER.pack(MAGIC, VERSION, HEADER.size, columns, rows, *counters, options, 0))
+    f.write(pack_bits(game.mines.tobytes(), 1))
+    f.write(pack_bits(game.flags.tobytes(), 2))
+    if hints:
+        f.write(memoryview(game.hints.table).cast('B') if game.hints.dtype == 'i1'
+            else bytes(h & 0xff for h in game.hints))
+
+def save(game, path, hints=False):
+    """Writes a bounded game to a file."""
+    with open(path, 'wb') as f:
+        write(game, f, hints)
+
+def dumps(game, hints=False):
+    """Returns a bounded game in the file format as bytes."""
+    f = io.BytesIO()
+    write(game, f, hints)
+    return f.getvalue()
+
+def load(path, use_mmap=True, cls=Game):
+    """Reads a game from a file.
+    If use_mmap is set, the planes are memory mapped with copy-on-write,
+    so changes to the game are never written back to the file.
+    """
+    with open(path, 'rb') as f:
+        if use_mmap:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:
+            data = bytearray(f.read())
+    return read(data, cls)
+
+def loads(data, cls=Game):
+    """Reads a game from bytes returned by dumps."""
+    return read(bytearray(data), cls)
+
+def read(data, cls=Game):
+    """Creates a game that uses the writable buffer data as storage."""
+    if len(data) < HEADER.size:
+        raise ValueError('File is too short for a header')
+    magic, version, header_size, columns, rows, *counters, options, _ = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a minesweeper game file')
+    if version > VERSION:
+        raise ValueError('Unsupported file version {0}'.format(version))
+
+    mines_size, flags_size, hints_size = plane_sizes(columns, rows)
+    end = header_size + mines_size + flags_size + (hints_size if options & OPTION_HINTS else 0)
+    if len(data) < end:
+        raise ValueError('File is truncated')
+
+    view = memoryview(data)
+    offset = header_size
+    counters = dict(zip(Game.COUNTERS, counters))
+    # the counters decide when the game is over, so they are checked against the
+    # mines plane and against each other, which is cheap compared to the flags
+    if int.from_bytes(view[offset:offset+mines_size], 'little').bit_count() != counters['num_mines']:
+        raise ValueError('The number of mines does not match the header')
+    if (counters['num_marked_mines'] > min(counters['num_marked'], counters['num_mines']) or
+            counters['num_revealed_mines'] > counters['num_mines'] or
+            counters['num_revealed_safe'] > columns*rows - counters['num_mines'] or
+            counters['num_revealed_safe'] + counters['num_revealed_mines'] + counters['num_marked'] > columns*rows):
+        raise ValueError('The counters of the header are inconsistent')
+    mines = PackedTable(columns, rows, 1, view[offset:offset+mines_size])
+    offset += mines_size
+    flags = PackedTable(columns, rows, 2, view[offset:offset+flags_size])
+    offset += flags_size
+    if options & OPTION_HINTS:
+        hints = Table.from_buffer(columns, rows, view[offset:offset+hints_size], dtype='i1')
+    else:
+        hints = compute_hints(mines)
+    return cls._from_tables(mines, flags, hints, counters)
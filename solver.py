@@ -0,0 +1,142 @@
+"""Deduces safe fields and mines of a minesweeper game"""
+
+from minesweeper import Flags
+
+class Solver:
+    """Finds fields that are certainly safe or certainly mines.
+    The solver only looks at what a player can see: the flags of the fields
+    and the hints of the revealed fields. Every revealed field gives a
+    constraint: its Unknown neighbors contain exactly its hint minus its
+    Marked neighbors mines.
+    Two rules are applied:
+    1. If a constraint needs no more mines, all its fields are safe.
+       If it needs as many mines as it has fields, all of them are mines.
+    2. If the fields of one constraint are a subset of the fields of a
+       nearby constraint, the remaining fields of the larger one contain
+       the difference of both mine counts, so rule 1 applies to them.
+    Only the constraints next to fields that changed since the last step are
+    examined again, so a step does not scan the whole board.
+    Marks are trusted, so a wrong mark set by a player misleads the solver.
+    """
+    def __init__(self, game):
+        self.game = game
+        # revealed fields whose constraint has to be examined again
+        self.pending = set()
+        columns, rows = game.column_count(), game.row_count()
+        if columns is not None and rows is not None:
+            for y in range(rows):
+                for x in range(columns):
+                    if game.flags[x, y] == Flags.Revealed:
+                        self.pending.add((x, y))
+
+    def update(self, fields):
+        """Schedules the constraints affected by changed fields for the next step."""
+        flags = self.game.flags
+        neighbors = self.game.mines.neighbors
+        for x, y in fields:
+            if flags[x, y] == Flags.Revealed:
+                self.pending.add((x, y))
+            for n in neighbors(x, y):
+                if flags[n] == Flags.Revealed:
+                    self.pending.add(n)
+
+    def constraint(self, x, y):
+        """Returns the Unknown neighbors of a revealed field and the number of mines among them."""
+        flags = self.game.flags
+        unknown = []
+        mines = self.game.hints[x, y]
+        for n in self.game.mines.neighbors(x, y):
+            f = flags[n]
+            if f == Flags.Unknown:
+                unknown.append(n)
+            elif f == Flags.Marked:
+                mines -= 1
+        return (frozenset(unknown), mines)
+
+    def nearby(self, x, y):
+        """Returns a generator of fields that can share Unknown neighbors with a field."""
+        columns, rows = self.game.column_count(), self.game.row_count()
+        for c in range(x-2, x+3):
+            if columns is not None and not 0 <= c < columns:
+                continue
+            for r in range(y-2, y+3):
+                if rows is not None and not 0 <= r < rows:
+                    continue
+                if c != x or r != y:
+                    yield (c, r)
+
+    def deduce(self):
+        """Examines all pending constraints.
+        Returns a tuple of the set of safe fields and the set of mines.
+        """
+        flags = self.game.flags
+        safe = set()
+        mines = set()
+        constraints = {}
+
+        def get(field):
+            c = constraints.get(field)
+            if c is None:
+                c = constraints[field] = self.constraint(*field)
+            return c
+
+        for field in self.pending:
+            unknown, count = get(field)
+            if not unknown:
+                continue
+            if count == 0:
+                safe.update(unknown)
+                continue
+            if count == len(unknown):
+                mines.update(unknown)
+                continue
+            for other in self.nearby(*field):
+                if flags[other] != Flags.Revealed:
+                    continue
+                other_unknown, other_count = get(other)
+                if not other_unknown:
+                    continue
+                # check both directions since the other field might not be pending
+                for small, small_count, large, large_count in (
+                        (unknown, count, other_unknown, other_count),
+                        (other_unknown, other_count, unknown, count)):
+                    if small < large:
+                        rest = large - small
+                        rest_count = large_count - small_count
+                        if rest_count == 0:
+                            safe.update(rest)
+                        elif rest_count == len(rest):
+                            mines.update(rest)
+        self.pending.clear()
+        return (safe, mines)
+
+    def step(self):
+        """Reveals all safe fields and marks all mines that can be deduced
+        from the fields that changed since the last step.
+        Returns the number of moves that were made.
+        """
+        safe, mines = self.deduce()
+        moves = 0
+        for x, y in mines:
+            if self.game.flags[x, y] == Flags.Unknown:
+                self.game.toggle_mark(x, y)
+                self.update(self.game.changed)
+                moves += 1
+        for x, y in safe:
+            if self.game.flags[x, y] == Flags.Unknown:
+                self.game.reveal(x, y)
+                self.update(self.game.changed)
+                moves += 1
+        return moves
+
+    def solve(self):
+        """Makes moves until the game is over or nothing more can be deduced.
+        Returns the total number of moves.
+        """
+        moves = 0
+        while not self.game.is_lost() and not self.game.is_solved():
+            n = self.step()
+            if n == 0:
+                break
+            moves += n
+        return moves
@@ -0,0 +1,306 @@
+"""Provides a minesweeper game for huge boards with few mines
+
+The mines are stored as a sorted array of linear indices, the flags only
+for fields that were changed and the hints are computed when they are
+read, so the memory depends on the number of mines and touched fields
+instead of the size of the board.
+"""
+
+import bisect
+import functools
+import random
+from array import array
+from minesweeper import Flags, Game, place_mines, storage
+from table import Table, linear_index
+
+# number of hints kept by the cache of a game
+HINT_CACHE_SIZE = 1 << 16
+
+class SparseTable(Table):
+    """2D table that only stores the cells that differ from the initial value.
+    The cells are kept in a dict by their linear index.
+    >>> t = SparseTable(100000, 100000)
+    >>> t[5, 99999] = 2
+    >>> t[5, 99999], t[6, 99999]
+    (2, 0)
+    >>> t[5, 99999] = 0
+    >>> t.table
+    {}
+    """
+    __slots__ = ('initial',)
+    dense = False
+
+    def __init__(self, columns, rows, initial=0):
+        if columns <= 0 or rows <= 0:
+            raise ValueError('Table size cannot be smaller than 1')
+        self.table = {}
+        self.num_columns = columns
+        self.num_rows = rows
+        self.dtype = None
+        self.initial = initial
+
+    def __getitem__(self, key):
+        return self.table.get(linear_index(self, key), self.initial)
+
+    def get(self, index):
+        """Returns the value of a cell by its linear index without checking it."""
+        return self.table.get(index, self.initial)
+
+    def __setitem__(self, key, value):
+        index = linear_index(self, key)
+        if value == self.initial:
+            self.table.pop(index, None)
+        else:
+            self.table[index] = value
+
+    def items(self):
+        """Returns the linear indices and values of the stored cells."""
+        return self.table.items()
+
+    def count(self, value):
+        stored = sum(1 for v in self.table.values() if v == value)
+        if value == self.initial:
+            return self.num_columns*self.num_rows - len(self.table) + stored
+        return stored
+
+    def row(self, r):
+        row_start = self.subscript_to_linear(0, r)
+        return [self[i] for i in range(row_start, row_start+self.num_columns)]
+
+    def __iter__(self):
+        for i in range(self.num_columns*self.num_rows):
+            yield self[i]
+
+    def tobytes(self):
+        return bytes(self)
+
+    def __eq__(self, other):
+        try:
+            return self.size() == other.size() and list(self) == list(other)
+        except (AttributeError, TypeError):
+            return False
+
+class MineTable(SparseTable):
+    """Table of booleans that stores the linear indices of the set cells in a sorted array.
+    Reading a cell is a binary search. Changing a cell moves the following
+    indices, so it is meant for a few changes only.
+    >>> mines = MineTable(1000, 1000, [999999, 5])
+    >>> mines[5, 0], mines[6, 0], mines[999, 999]
+    (1, 0, 1)
+    >>> mines.count(True)
+    2
+    """
+    __slots__ = ()
+
+    def __init__(self, columns, rows, indices=()):
+        super().__init__(columns, rows, 0)
+        self.table = array('q', sorted(set(indices)))
+        if self.table and not (0 <= self.table[0] and self.table[-1] < columns*rows):
+            raise ValueError('Mine indices must be between 0 and {0}'.format(columns*rows - 1))
+
+    @classmethod
+    def from_table(cls, table):
+        """Creates a MineTable with the set cells of any table."""
+        return cls(table.num_columns, table.num_rows, (i for i, m in enumerate(table) if m))
+
+    def has(self, index):
+        """Returns True if the cell with a linear index is set."""
+        table = self.table
+        i = bisect.bisect_left(table, index)
+        return i < len(table) and table[i] == index
+
+    def __getitem__(self, key):
+        return int(self.has(linear_index(self, key)))
+
+    def __setitem__(self, key, value):
+        index = linear_index(self, key)
+        table = self.table
+        i = bisect.bisect_left(table, index)
+        present = i < len(table) and table[i] == index
+        if value and not present:
+            table.insert(i, index)
+        elif not value and present:
+            del table[i]
+
+    def items(self):
+        return ((i, 1) for i in self.table)
+
+    def count(self, value):
+        if value:
+            return len(self.table)
+        return self.num_columns*self.num_rows - len(self.table)
+
+class HintTable(SparseTable):
+    """Read-only table of the hints of a mines table, which are computed when they are read.
+    The most recently read hints are kept in an LRU cache.
+    """
+    __slots__ = ('hint',)
+
+    def __init__(self, mines, cache_size=HINT_CACHE_SIZE):
+        super().__init__(mines.num_columns, mines.num_rows, 0)
+        self.dtype = 'i1'
+        has = mines.has
+        neighbor_indices = mines.neighbor_indices
+        def hint(index):
+            if has(index):
+                return -1
+            return sum(1 for n in neighbor_indices(index) if has(n))
+        # the hint of a linear index
+        self.hint = functools.lru_cache(maxsize=cache_size)(hint)
+
+    def __getitem__(self, key):
+        return self.hint(linear_index(self, key))
+
+    def __setitem__(self, key, value):
+        raise TypeError('Hints are computed from the mines and cannot be set')
+
+    def count(self, value):
+        return sum(1 for v in self if v == value)
+
+    def clear(self):
+        """Forgets all cached hints after the mines changed."""
+        self.hint.cache_clear()
+
+def sample_mines(columns, rows, number_of_mines, seed=None, safe=None):
+    """Returns a MineTable with randomly placed mines like minesweeper.place_mines.
+    The random indices are collected in a set, so no memory is allocated for the other fields
+    unless more than half of them are mines.
+    >>> mines = sample_mines(100000, 100000, 1000, seed=1, safe=(0, 0))
+    >>> mines.count(True), mines[0, 0] or mines[1, 1]
+    (1000, 0)
+    >>> sample_mines(3, 3, 1, safe=(1, 1))
+    Traceback (most recent call last):
+    ...
+    ValueError: Cannot place 1 mines on 0 fields
+    """
+    rng = random.Random(seed)
+    num_fields = columns*rows
+    mines = MineTable(columns, rows)
+    excluded = set()
+    if safe is not None:
+        if not (0 <= safe[0] < columns and 0 <= safe[1] < rows):
+            raise IndexError('Safe field {0} is outside of the board'.format(tuple(safe)))
+        start = mines.subscript_to_linear(*safe)
+        excluded.update([start] + mines.neighbor_indices(start))
+    available = num_fields - len(excluded)
+    if number_of_mines < 0 or number_of_mines > available:
+        raise ValueError('Cannot place {0} mines on {1} fields'.format(number_of_mines, available))
+    if number_of_mines > available//2:
+        # such boards are not sparse, so the dense placement is used
+        return MineTable.from_table(place_mines(columns, rows, number_of_mines, seed, safe))
+
+    indices = set()
+    random_value = rng.random
+    while len(indices) < number_of_mines:
+        i = int(random_value()*num_fields)
+        if i not in excluded:
+            indices.add(i)
+    mines.table = array('q', sorted(indices))
+    return mines
+
+class SparseGame(Game):
+    """Game for huge boards with few mines whose memory does not grow with the size of the board.
+    The mines are a MineTable, the flags a SparseTable unless another flags
+    table is given and the hints a HintTable. Revealing a field only visits
+    the region it opens, which can still be most of the board if there are
+    very few mines. Since the fields cannot all be revealed, reveal_all
+    reveals only the mines that are not marked.
+    >>> columns = 100000
+    >>> game = SparseGame(MineTable(columns, columns, [2, 2 + columns, 2*columns, 1 + 2*columns, 2 + 2*columns]))
+    >>> game.reveal(0, 0)
+    True
+    >>> game.num_revealed_safe, len(game.flags.table), game.hints[1, 1]
+    (4, 4, 5)
+    """
+    def __init__(self, mines, flags=None, cache_size=HINT_CACHE_SIZE):
+        if not isinstance(mines, MineTable):
+            mines = MineTable.from_table(mines)
+        if flags is None:
+            flags = SparseTable(mines.num_columns, mines.num_rows, Flags.Unknown)
+        if mines.size() != flags.size():
+            raise ValueError('Fields cannot have different sizes ({0} != {1})'.format(mines.size(), flags.size()))
+        self.mines = mines
+        self.flags = flags
+        self.hints = HintTable(mines, cache_size)
+        self.changed = []
+        self._count_fields()
+
+    @classmethod
+    def create_random(cls, columns, rows, number_of_mines, seed=None, safe=None):
+        return cls(sample_mines(columns, rows, number_of_mines, seed, safe))
+
+    def _touched(self):
+        """Returns the linear indices and flags of the fields that are not Unknown."""
+        if isinstance(self.flags, SparseTable):
+            return self.flags.items()
+        return ((i, f) for i, f in enumerate(self.flags) if f != Flags.Unknown)
+
+    def _count_fields(self):
+        has = self.mines.has
+        self.num_mines = self.mines.count(True)
+        self.num_revealed_safe = 0
+        self.num_revealed_mines = 0
+        self.num_marked = 0
+        self.num_marked_mines = 0
+        for i, f in self._touched():
+            if f == Flags.Revealed:
+                if has(i):
+                    self.num_revealed_mines += 1
+                else:
+                    self.num_revealed_safe += 1
+            elif f == Flags.Marked:
+                self.num_marked += 1
+                if has(i):
+                    self.num_marked_mines += 1
+
+    def hint(self, x, y):
+        """Returns the hint from the cache of the hints table."""
+        return self.hints[x, y]
+
+    def _update_hints(self, indices):
+        self.hints.clear()
+
+    def _flood_fill(self, fields):
+        """Reveals like Game._flood_fill but reads the sparse tables by linear index directly."""
+        columns = self.mines.num_columns
+        flags, has, hint = self.flags, self.mines.has, self.hints.hint
+        get = flags.get if isinstance(flags, SparseTable) else storage(flags).__getitem__
+        neighbor_indices = self.mines.neighbor_indices
+        set_flag = self._set_flag
+        unknown, revealed = Flags.Unknown, Flags.Revealed
+        ok = True
+        queue = []
+        for x, y in fields:
+            if get(x + y*columns) == unknown:
+                set_flag(x, y, revealed)
+                queue.append(x + y*columns)
+        while queue:
+            i = queue.pop()
+            if has(i):
+                ok = False
+            elif hint(i) == 0:
+                for n in neighbor_indices(i):
+                    if get(n) == unknown:
+                        set_flag(n % columns, n // columns, revealed)
+                        queue.append(n)
+        return ok
+
+    def auto_mark(self):
+        """Marks all mines but only if all non-mine fields are already revealed."""
+        num_fields = self.mines.num_columns*self.mines.num_rows
+        if self.num_revealed_safe != num_fields - self.num_mines:
+            return False
+        for i in self.mines.table:
+            x, y = self.mines.linear_to_subscript(i)
+            if self.flags[x, y] != Flags.Marked:
+                self._set_flag(x, y, Flags.Marked)
+
+    def reveal_all(self):
+        """Reveals all mines that are not marked."""
+        self.changed = []
+        for i in self.mines.table:
+            x, y = self.mines.linear_to_subscript(i)
+            if self.flags[x, y] == Flags.Unknown:
+                self._set_flag(x, y, Flags.Revealed)
+        if self.check_consistency:
+            self.check_counters()
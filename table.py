@@ -1,6 +1,119 @@
 """Provides a 2D table of values"""
 
+import functools
 import itertools
+from array import array
+
+# numpy style type names and the matching typecodes of the array module
+DTYPES = {
+    'u1': 'B', 'i1': 'b',
+    'u2': 'H', 'i2': 'h',
+    'u4': 'I', 'i4': 'i',
+    'u8': 'Q', 'i8': 'q',
+    'f4': 'f', 'f8': 'd',
+}
+
+def typecode(dtype):
+    """Returns the array typecode for a dtype.
+    The dtype can either be a numpy style name (e.g. 'u1') or an array typecode (e.g. 'B').
+    >>> typecode('u1')
+    'B'
+    >>> typecode('b')
+    'b'
+    >>> typecode('x')
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown dtype 'x'
+    """
+    if dtype in DTYPES:
+        return DTYPES[dtype]
+    if dtype in DTYPES.values():
+        return dtype
+    raise ValueError('Unknown dtype {0!r}'.format(dtype))
+
+@functools.lru_cache(maxsize=64)
+def neighbor_offsets(columns, rows):
+    """Returns the linear index offsets of the neighbors of a cell for a table shape.
+    The result has an entry for each of the 16 border cases, see border_case.
+    Inside the table all cells have the same offsets, so the offsets of a
+    shape fit into a few tuples instead of a list of neighbors per cell.
+    >>> neighbor_offsets(4, 3)[0]
+    (-5, -1, 3, -4, 4, -3, 1, 5)
+    >>> neighbor_offsets(4, 3)[border_case(0, 4, 3)]
+    (4, 1, 5)
+    """
+    offsets = []
+    for case in range(16):
+        left, right, top, bottom = case & 1, case & 2, case & 4, case & 8
+        offsets.append(tuple(
+            dx + dy*columns
+            for dx in (-1, 0, 1) if not (dx < 0 and left or dx > 0 and right)
+            for dy in (-1, 0, 1) if not (dy < 0 and top or dy > 0 and bottom)
+            if dx or dy))
+    return tuple(offsets)
+
+def border_case(index, columns, rows):
+    """Returns the border case of a cell for neighbor_offsets.
+    Bit 0 to 3 are set if the cell is in the first column, last column, first row or last row.
+    >>> border_case(0, 4, 3), border_case(5, 4, 3), border_case(11, 4, 3)
+    (5, 0, 10)
+    """
+    x = index % columns
+    return (x == 0) | (x == columns - 1) << 1 | (index < columns) << 2 | (index >= columns*(rows - 1)) << 3
+
+def linear_index(table, key):
+    """Returns the linear index of a key (column, row) or of a linear index with the same rules as Table.
+    >>> t = Table(3, 2)
+    >>> linear_index(t, (1, 1)), linear_index(t, -1)
+    (4, 5)
+    """
+    try:
+        x, y = key
+    except TypeError:
+        if isinstance(key, slice):
+            raise TypeError("Slicing requires a (columns, rows) tuple")
+        index = key
+    else:
+        if x >= table.num_columns or y >= table.num_rows:
+            raise IndexError('list index out of range')
+        index = x + y*table.num_columns
+    num_cells = table.num_columns*table.num_rows
+    if index < 0:
+        index += num_cells
+    if not 0 <= index < num_cells:
+        raise IndexError('list index out of range')
+    return index
+
+def _region_range(key, size):
+    """Returns the start and stop of a slice or a single index within size.
+    >>> _region_range(slice(1, None), 4), _region_range(-1, 4)
+    ((1, 4), (3, 4))
+    """
+    if isinstance(key, slice):
+        start, stop, step = key.indices(size)
+        if step != 1:
+            raise ValueError('Slices with steps are not supported')
+        return (start, max(start, stop))
+    index = key + size if key < 0 else key
+    if not 0 <= index < size:
+        raise IndexError('list index out of range')
+    return (index, index + 1)
+
+def _slice_values(storage, start, stop):
+    """Returns storage[start:stop] without copying if the storage supports the buffer protocol."""
+    if isinstance(storage, list):
+        return storage[start:stop]
+    return memoryview(storage)[start:stop]
+
+def _assign_values(storage, start, stop, values):
+    """Writes a sequence of values to storage[start:stop]."""
+    if isinstance(storage, list):
+        storage[start:stop] = values
+    else:
+        code = storage.typecode if isinstance(storage, array) else storage.format
+        if not isinstance(values, array) or values.typecode != code:
+            values = array(code, values)
+        storage[start:stop] = values
 
 class Table:
     """2D table of values with m columns and n rows.
@@ -34,13 +147,35 @@ class Table:
     4
     >>> t.num_columns
     3
+
+    If a dtype is given, the values are stored in a compact typed array
+    instead of a list of Python objects:
+    >>> t = Table(2, 2, True, dtype='u1')
+    >>> t
+    Table 2x2:
+    [1, 1]
+    [1, 1]
+    >>> t.table.itemsize
+    1
+    >>> t[0, 0] = 256
+    Traceback (most recent call last):
+    ...
+    OverflowError: unsigned byte integer is greater than maximum
     """
-    def __init__(self, columns, rows, initial=0):
+    __slots__ = ('table', 'num_columns', 'num_rows', 'dtype')
+    # the table stores every cell, so tobytes needs no more memory than the table itself
+    dense = True
+
+    def __init__(self, columns, rows, initial=0, dtype=None):
         if columns <= 0 or rows <= 0:
             raise ValueError('Table size cannot be smaller than 1')
-        self.table = [initial for c in range(columns*rows)]
+        if dtype is None:
+            self.table = [initial]*(columns*rows)
+        else:
+            self.table = array(typecode(dtype), [initial])*(columns*rows)
         self.num_columns = columns
         self.num_rows = rows
+        self.dtype = dtype
 
     def size(self):
         """Returns the dimensions of the table as a tuple."""
@@ -72,9 +207,24 @@ class Table:
         0
         >>> t[5]
         5
+
+        If any part of a tuple key is a slice, a TableView of the region is
+        returned, which shares the storage with the table. An integer part
+        selects a single column or row:
+        >>> t[1:, :]
+        Table 2x2:
+        [1, 2]
+        [4, 5]
+        >>> t[:, 1]
+        Table 3x1:
+        [3, 4, 5]
+        >>> t[1:2]
+        Traceback (most recent call last):
+        ...
+        TypeError: Slicing requires a (columns, rows) tuple
         """
         if isinstance(key, slice):
-            raise TypeError("Slicing is not supported")
+            raise TypeError("Slicing requires a (columns, rows) tuple")
         else:
             try:
                 x, y = key
@@ -82,6 +232,8 @@ class Table:
                     raise IndexError('list index out of range')
                 return self.table[self.subscript_to_linear(x, y)]
             except TypeError:
+                if isinstance(key, tuple):
+                    return self.view(*key)
                 return self.table[key]
 
     def __setitem__(self, key, value):
@@ -104,9 +256,18 @@ class Table:
         Table 3x2:
         [4, 5, 0]
         [6, 1, 0]
+
+        Assigning to a region sets all of its cells to a value or copies
+        the values of a table of the same size:
+        >>> t[1:, :] = 7
+        >>> t[0, :] = Table.from_nested_list([[8], [9]])
+        >>> t
+        Table 3x2:
+        [8, 7, 7]
+        [9, 7, 7]
         """
         if isinstance(key, slice):
-            raise TypeError("Slicing is not supported")
+            raise TypeError("Slicing requires a (columns, rows) tuple")
         else:
             try:
                 x, y = key
@@ -114,7 +275,18 @@ class Table:
                     raise IndexError('list index out of range')
                 self.table[self.subscript_to_linear(x, y)] = value
             except TypeError:
-                self.table[key] = value
+                if isinstance(key, tuple):
+                    self.view(*key).assign(value)
+                else:
+                    self.table[key] = value
+
+    def view(self, columns, rows):
+        """Returns a TableView of a region given as a slice or an index for both dimensions.
+        Slices with steps are not supported.
+        """
+        x0, x1 = _region_range(columns, self.num_columns)
+        y0, y1 = _region_range(rows, self.num_rows)
+        return TableView(self, x0, y0, x1 - x0, y1 - y0)
 
     def neighbors(self, x, y):
         """Returns a generator for all direct neighbors of a cell.
@@ -126,6 +298,18 @@ class Table:
                 if c != x or r != y:
                     yield (c, r)
 
+    def neighbor_indices(self, index):
+        """Returns a list of the linear indices of all direct neighbors of a cell given by its linear index.
+        The indices are in the same order as the cells returned by neighbors.
+        >>> t = Table(4, 3)
+        >>> t.neighbor_indices(0)
+        [4, 1, 5]
+        >>> [t.linear_to_subscript(i) for i in t.neighbor_indices(0)] == list(t.neighbors(0, 0))
+        True
+        """
+        columns, rows = self.num_columns, self.num_rows
+        return [index + o for o in neighbor_offsets(columns, rows)[border_case(index, columns, rows)]]
+
     def linear_to_subscript(self, index):
         """Converts a linear index to a supscript index of (column, row)."""
         return (index % self.num_columns, index // self.num_columns)
@@ -136,7 +320,19 @@ class Table:
 
     def count(self, value):
         """Returns the number of occurrences of value in the table."""
-        return self.table.count(value)
+        try:
+            return self.table.count(value)
+        except AttributeError:
+            # memoryviews cannot count
+            return sum(1 for v in self.table if v == value)
+
+    def tobytes(self):
+        """Returns the values in linear index order as bytes.
+        All values must be between 0 and 255.
+        >>> Table.from_nested_list([[True, False], [False, 2]]).tobytes()
+        b'\\x01\\x00\\x00\\x02'
+        """
+        return bytes(self.table)
 
     def row(self, r):
         """Returns a row as a list.
@@ -147,16 +343,23 @@ class Table:
         [8, 9, 10, 11]
         """
         row_start = self.subscript_to_linear(0, r)
-        return self.table[row_start:row_start+self.num_columns]
+        return list(self.table[row_start:row_start+self.num_columns])
 
     def __eq__(self, other):
-        """Returns true if other table has the same dimensions and content."""
+        """Returns true if other table has the same dimensions and content.
+        The storage type is not compared:
+        >>> Table(2, 2, 1) == Table(2, 2, 1, dtype='u1')
+        True
+        >>> Table(2, 2, 1) == Table(2, 2, 0, dtype='u1')
+        False
+        """
         try:
-            return (
-                self.num_columns == other.num_columns and
-                self.num_rows == other.num_rows and
-                self.table == other.table
-            )
+            if (self.num_columns != other.num_columns or
+                    self.num_rows != other.num_rows):
+                return False
+            if type(self) is type(other) and type(self.table) is type(other.table):
+                return self.table == other.table
+            return list(self) == list(other)
         except AttributeError:
             return False
 
@@ -179,9 +382,54 @@ class Table:
         >>> [c for c in t]
         [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
         """
-        for y in range(self.num_rows):
-            for x in range(self.num_columns):
-                yield self[x,y]
+        # the storage is already in the same order as the linear index
+        return iter(self.table)
+
+    @classmethod
+    def from_list(cls, columns, rows, values, dtype=None):
+        """Creates a table from values given in linear index order.
+        >>> Table.from_list(3, 2, [0, 1, 2, 3, 4, 5], dtype='i1')
+        Table 3x2:
+        [0, 1, 2]
+        [3, 4, 5]
+        >>> Table.from_list(3, 2, [0, 1, 2])
+        Traceback (most recent call last):
+        ...
+        ValueError: Expected 6 values but got 3
+        """
+        t = Table(1, 1, dtype=dtype)
+        if dtype is None:
+            t.table = list(values)
+        else:
+            t.table = array(typecode(dtype), values)
+        if len(t.table) != columns*rows:
+            raise ValueError('Expected {0} values but got {1}'.format(columns*rows, len(t.table)))
+        t.num_columns = columns
+        t.num_rows = rows
+        return t
+
+    @classmethod
+    def from_buffer(cls, columns, rows, buffer, dtype):
+        """Creates a table that uses an object supporting the buffer protocol
+        (e.g. an mmap) as storage without copying it.
+        >>> data = bytearray(b'\\x01\\x02\\xff\\x00')
+        >>> t = Table.from_buffer(2, 2, data, dtype='i1')
+        >>> t
+        Table 2x2:
+        [1, 2]
+        [-1, 0]
+        >>> t[0, 0] = 5
+        >>> data[0]
+        5
+        """
+        view = memoryview(buffer).cast(typecode(dtype))
+        if len(view) != columns*rows:
+            raise ValueError('Expected {0} values but got {1}'.format(columns*rows, len(view)))
+        t = Table(1, 1, dtype=dtype)
+        t.table = view
+        t.num_columns = columns
+        t.num_rows = rows
+        return t
 
     @classmethod
     def from_nested_list(cls, list_of_list):
@@ -204,3 +452,232 @@ class Table:
         t = Table(len(list_of_list[0]), len(list_of_list))
         t.table = list(itertools.chain(*list_of_list))
         return t
+
+def pack_bits(values, bits):
+    """Packs bytes with values smaller than 2**bits into bytes with 8/bits values each.
+    The first value is stored in the lowest bits of the first byte.
+    bits must be 1, 2 or 4.
+    >>> pack_bits(bytes([1, 0, 1, 1, 0, 0, 0, 0, 1]), 1)
+    b'\\r\\x01'
+    >>> pack_bits(bytes([2, 1, 0, 3, 1]), 2)
+    b'\\xc6\\x01'
+    """
+    per_byte = 8//bits
+    size = (len(values) + per_byte - 1)//per_byte
+    values = bytes(values) + bytes(size*per_byte - len(values))
+    # every value only occupies its own bits of the byte, so adding the
+    # shifted values of all positions as big integers cannot carry over
+    packed = 0
+    for k in range(per_byte):
+        packed += int.from_bytes(values[k::per_byte], 'little') << (k*bits)
+    return packed.to_bytes(size, 'little')
+
+def unpack_bits(packed, bits, count):
+    """Reverses pack_bits and returns count values as bytes.
+    >>> unpack_bits(b'\\r\\x01', 1, 9)
+    b'\\x01\\x00\\x01\\x01\\x00\\x00\\x00\\x00\\x01'
+    >>> unpack_bits(b'\\xc6\\x01', 2, 5)
+    b'\\x02\\x01\\x00\\x03\\x01'
+    """
+    per_byte = 8//bits
+    size = (count + per_byte - 1)//per_byte
+    packed = int.from_bytes(bytes(packed[:size]), 'little')
+    mask = int.from_bytes(bytes([(1 << bits) - 1])*size, 'little')
+    values = bytearray(size*per_byte)
+    for k in range(per_byte):
+        values[k::per_byte] = ((packed >> (k*bits)) & mask).to_bytes(size, 'little')
+    return bytes(values[:count])
+
+class PackedTable(Table):
+    """2D table of small unsigned integers with 1, 2 or 4 bits per cell.
+    The values are stored with pack_bits in a bytearray or in any writable
+    object supporting the buffer protocol, e.g. a memory mapped file.
+    >>> t = PackedTable(3, 2, bits=2)
+    >>> t[1, 0] = 3
+    >>> t[2] = 2
+    >>> t[5] = 1
+    >>> t
+    Table 3x2:
+    [0, 3, 2]
+    [0, 0, 1]
+    >>> list(t.table)
+    [44, 4]
+    >>> t == Table.from_nested_list([[0, 3, 2], [0, 0, 1]])
+    True
+    >>> t[0, 0] = 4
+    Traceback (most recent call last):
+    ...
+    ValueError: Value 4 does not fit into 2 bits
+    """
+    __slots__ = ('bits',)
+
+    def __init__(self, columns, rows, bits=1, buffer=None):
+        if columns <= 0 or rows <= 0:
+            raise ValueError('Table size cannot be smaller than 1')
+        if bits not in (1, 2, 4):
+            raise ValueError('Bits per cell must be 1, 2 or 4')
+        size = (columns*rows*bits + 7)//8
+        if buffer is None:
+            buffer = bytearray(size)
+        elif len(buffer) != size:
+            raise ValueError('Expected a buffer of {0} bytes but got {1}'.format(size, len(buffer)))
+        self.table = buffer
+        self.num_columns = columns
+        self.num_rows = rows
+        self.dtype = None
+        self.bits = bits
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and (isinstance(key[0], slice) or isinstance(key[1], slice)):
+            return self.view(*key)
+        bit = linear_index(self, key)*self.bits
+        return (self.table[bit >> 3] >> (bit & 7)) & ((1 << self.bits) - 1)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple) and (isinstance(key[0], slice) or isinstance(key[1], slice)):
+            self.view(*key).assign(value)
+            return
+        value = int(value)
+        mask = (1 << self.bits) - 1
+        if not 0 <= value <= mask:
+            raise ValueError('Value {0} does not fit into {1} bits'.format(value, self.bits))
+        bit = linear_index(self, key)*self.bits
+        byte = self.table[bit >> 3] & ~(mask << (bit & 7))
+        self.table[bit >> 3] = byte | (value << (bit & 7))
+
+    def tobytes(self):
+        return unpack_bits(self.table, self.bits, self.num_columns*self.num_rows)
+
+    def __iter__(self):
+        return iter(self.tobytes())
+
+    def count(self, value):
+        return self.tobytes().count(value)
+
+    def row(self, r):
+        row_start = self.subscript_to_linear(0, r)
+        return [self[i] for i in range(row_start, row_start+self.num_columns)]
+
+    def __eq__(self, other):
+        try:
+            return (
+                self.num_columns == other.num_columns and
+                self.num_rows == other.num_rows and
+                list(self) == list(other)
+            )
+        except (AttributeError, TypeError):
+            return False
+
+class TableView(Table):
+    """Rectangular region of a table that shares its storage.
+    The view has its own column and row coordinates starting at 0 and
+    changes are visible in the table and the other way around. Rows of
+    typed tables are accessed through memoryviews, so iterating a view
+    does not copy the values. Views of views refer to the original table.
+    >>> t = Table.from_list(4, 3, range(12), dtype='u1')
+    >>> v = t[1:3, 1:]
+    >>> v
+    Table 2x2:
+    [5, 6]
+    [9, 10]
+    >>> v[0, 1] = 0
+    >>> t[1, 2]
+    0
+    >>> v[1, :].base is t
+    True
+    >>> list(v), v.count(0), v.tobytes()
+    ([5, 6, 0, 10], 1, b'\\x05\\x06\\x00\\n')
+    """
+    __slots__ = ('base', 'x0', 'y0')
+
+    def __init__(self, base, x0, y0, columns, rows):
+        if isinstance(base, TableView):
+            x0 += base.x0
+            y0 += base.y0
+            base = base.base
+        self.base = base
+        self.table = base.table
+        self.x0 = x0
+        self.y0 = y0
+        self.num_columns = columns
+        self.num_rows = rows
+        self.dtype = base.dtype
+
+    def _base_linear(self, key):
+        """Returns the linear index in the base table of a key of the view."""
+        try:
+            x, y = key
+        except TypeError:
+            num_cells = self.num_columns*self.num_rows
+            index = key + num_cells if key < 0 else key
+            if not 0 <= index < num_cells:
+                raise IndexError('list index out of range')
+            x, y = self.linear_to_subscript(index)
+        else:
+            if not (0 <= x < self.num_columns and 0 <= y < self.num_rows):
+                raise IndexError('list index out of range')
+        return self.x0 + x + (self.y0 + y)*self.base.num_columns
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and (isinstance(key[0], slice) or isinstance(key[1], slice)):
+            return self.view(*key)
+        return self.base[self._base_linear(key)]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple) and (isinstance(key[0], slice) or isinstance(key[1], slice)):
+            self.view(*key).assign(value)
+        else:
+            self.base[self._base_linear(key)] = value
+
+    def rows(self):
+        """Returns a generator of the values of every row.
+        Rows of tables with array or buffer storage are memoryviews into the storage.
+        """
+        stride = self.base.num_columns
+        start = self.x0 + self.y0*stride
+        if isinstance(self.base, PackedTable):
+            for r in range(self.num_rows):
+                yield [self.base[start + r*stride + c] for c in range(self.num_columns)]
+        else:
+            for r in range(self.num_rows):
+                yield _slice_values(self.table, start + r*stride, start + r*stride + self.num_columns)
+
+    def assign(self, value):
+        """Sets all cells to a value or to the values of a table of the same size."""
+        if isinstance(value, Table):
+            if value.size() != self.size():
+                raise ValueError('Cannot assign a table of size {0} to a region of size {1}'.format(
+                    value.size(), self.size()))
+            # copy the values first, since both may share the storage
+            values = [list(row) for row in value.view(slice(None), slice(None)).rows()]
+        else:
+            values = [[value]*self.num_columns]*self.num_rows
+        stride = self.base.num_columns
+        start = self.x0 + self.y0*stride
+        for r, row in enumerate(values):
+            begin = start + r*stride
+            if isinstance(self.base, PackedTable):
+                for c, v in enumerate(row):
+                    self.base[begin + c] = v
+            else:
+                _assign_values(self.table, begin, begin + self.num_columns, row)
+
+    def __iter__(self):
+        for row in self.rows():
+            yield from row
+
+    def row(self, r):
+        for values in self.view(slice(None), r).rows():
+            return list(values)
+
+    def count(self, value):
+        return sum(1 for v in self if v == value)
+
+    def tobytes(self):
+        return bytes(self)
+
+    def __eq__(self, other):
+        try:
+            return self.size() == other.size() and list(self) == list(other)
+        except (AttributeError, TypeError):
+            return False